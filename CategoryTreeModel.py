@@ -0,0 +1,129 @@
+import os
+
+from PySide6.QtCore import QAbstractItemModel, QModelIndex, Qt
+
+
+class CategoryNode():
+    def __init__(self, path, parent=None):
+        self.path = path
+        self.parent = parent
+        # None until the folder is listed
+        self.children = None
+
+
+# Folder tree of the categories. A folder's subfolders are only listed when
+# the view expands it, through the listing cache of FileCollection.sub_dirs.
+class CategoryTreeModel(QAbstractItemModel):
+    def __init__(self, file_collection, parent=None):
+        super().__init__(parent)
+        self.file_collection = file_collection
+        self.root = CategoryNode(file_collection.path_to_user_files)
+        # Path -> node of the listed part of the tree
+        self.nodes = {self.root.path: self.root}
+
+    def node(self, index) -> CategoryNode:
+        if not index.isValid():
+            return None
+        return index.internalPointer()
+
+    def index_of(self, node: CategoryNode):
+        if node.parent is None:
+            return self.createIndex(0, 0, node)
+        return self.createIndex(node.parent.children.index(node), 0, node)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, self.root)
+        return self.createIndex(row, column, self.node(parent).children[row])
+
+    def parent(self, index):
+        node = self.node(index)
+        if node is None or node.parent is None:
+            return QModelIndex()
+        return self.index_of(node.parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return 1
+        node = self.node(parent)
+        if node.children is None:
+            return 0
+        return len(node.children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return True
+        node = self.node(parent)
+        if node.children is None:
+            # Shows the expand arrow without listing the subfolders
+            sub_dirs = self.file_collection.dir_tree.get(node.path)
+            return sub_dirs is None or len(sub_dirs) > 0
+        return len(node.children) > 0
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        return node is not None and node.children is None
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if node is None or node.children is not None:
+            return
+        sub_dirs = self.file_collection.sub_dirs(node.path)
+        node.children = []
+        if len(sub_dirs) == 0:
+            return
+        self.beginInsertRows(parent, 0, len(sub_dirs) - 1)
+        for sub_dir in sub_dirs:
+            child = CategoryNode(os.path.join(node.path, sub_dir), node)
+            node.children.append(child)
+            self.nodes[child.path] = child
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        node = self.node(index)
+        if node is None:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(node.path)
+        elif role == Qt.ItemDataRole.UserRole:
+            return node.path
+        return None
+
+    # The folder events of the file watcher, after dir_tree was updated.
+    # Only folders that are listed already get a node.
+
+    def directory_added(self, path):
+        parent_node = self.nodes.get(os.path.dirname(path))
+        if parent_node is None or path in self.nodes:
+            return
+        if parent_node.children is None:
+            # Listed from dir_tree once expanded, the arrow may show now
+            parent_index = self.index_of(parent_node)
+            self.dataChanged.emit(parent_index, parent_index)
+            return
+        row = len(parent_node.children)
+        self.beginInsertRows(self.index_of(parent_node), row, row)
+        child = CategoryNode(path, parent_node)
+        parent_node.children.append(child)
+        self.nodes[path] = child
+        self.endInsertRows()
+
+    def directory_removed(self, path):
+        node = self.nodes.get(path)
+        if node is None or node.parent is None:
+            return
+        row = node.parent.children.index(node)
+        self.beginRemoveRows(self.index_of(node.parent), row, row)
+        del node.parent.children[row]
+        self.endRemoveRows()
+        removed = [node]
+        while len(removed) > 0:
+            removed_node = removed.pop()
+            self.nodes.pop(removed_node.path, None)
+            if removed_node.children is not None:
+                removed.extend(removed_node.children)
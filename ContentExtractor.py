@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+import time
+
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+
+# Extractors get the path, the maximum number of characters and the
+# monotonic time by which they have to be done. They return the text, or
+# None if the file has none to index. Long running ones check the deadline
+# between pages and paragraphs and return what they have, ContentExtractor
+# stops the ones that don't get done in time.
+
+plain_text_extensions = [
+    ".txt", ".md", ".csv", ".tsv", ".log", ".ini", ".cfg", ".json", ".xml",
+    ".html", ".htm", ".rtf", ".py", ".js", ".css", ".sql", ".yaml", ".yml"]
+
+
+def extract_plain_text(path, max_characters, deadline) -> Optional[str]:
+    with open(path, encoding="utf-8", errors="replace") as file:
+        return file.read(max_characters)
+
+
+def extract_pdf(path, max_characters, deadline) -> Optional[str]:
+    texts = []
+    length = 0
+    for page in pypdf.PdfReader(path).pages:
+        if length >= max_characters or time.monotonic() > deadline:
+            break
+        text = page.extract_text() or ""
+        texts.append(text)
+        length += len(text)
+    return "\n".join(texts)[:max_characters]
+
+
+def extract_docx(path, max_characters, deadline) -> Optional[str]:
+    texts = []
+    length = 0
+    for paragraph in docx.Document(path).paragraphs:
+        if length >= max_characters or time.monotonic() > deadline:
+            break
+        texts.append(paragraph.text)
+        length += len(paragraph.text)
+    return "\n".join(texts)[:max_characters]
+
+
+# Extension -> extractor, see register_extractor
+extractors: Dict[str, Callable[[str, int, float], Optional[str]]] = {}
+
+
+def register_extractor(extensions: Iterable[str], extractor):
+    # The extractor has to be a module level function, it is passed to the
+    # worker processes of ContentExtractor by name
+    for extension in extensions:
+        extractors[extension.lower()] = extractor
+
+
+register_extractor(plain_text_extensions, extract_plain_text)
+if pypdf is not None:
+    register_extractor([".pdf"], extract_pdf)
+if docx is not None:
+    register_extractor([".docx"], extract_docx)
+
+
+def extractor_of(path):
+    return extractors.get(os.path.splitext(path)[1].lower())
+
+
+def extract(extractor, path, max_characters, seconds) -> Tuple[str, Optional[str]]:
+    # Runs in the worker processes
+    try:
+        return path, extractor(path, max_characters, time.monotonic() + seconds)
+    except Exception:
+        # Unreadable or broken file, indexed without content
+        return path, None
+
+
+# Pool of worker processes extracting the text of files for the content
+# field. Files above max_file_megabytes aren't read, texts are cut after
+# max_characters. An extraction that takes longer than `seconds`, e.g. of a
+# hanging file, is given up and the pool is started again, the other
+# extractions running at the time are started again in the new pool.
+class ContentExtractor():
+    # Seconds between looking at the running extractions
+    poll_interval: float = 0.05
+
+    def __init__(self, processes=None, max_file_megabytes=20,
+                 max_characters=200000, seconds=10.0):
+        if processes is None:
+            processes = min(4, os.cpu_count() or 1)
+        self.processes = processes
+        self.max_file_bytes = max_file_megabytes * 1024 * 1024
+        self.max_characters = max_characters
+        self.seconds = seconds
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def extract_many(self, paths: List[str],
+                     is_cancelled=None) -> Tuple[Dict[str, Optional[str]], List[str]]:
+        # path -> text of the files that were looked at, None for files
+        # without an extractor, too big, unreadable or without text, and
+        # the files whose extraction took too long. Files not done once
+        # is_cancelled() returns True are in neither.
+        texts = {}
+        timed_out_paths = []
+        to_extract = deque()
+        for path in paths:
+            extractor = extractor_of(path)
+            try:
+                if extractor is not None and os.stat(path).st_size <= self.max_file_bytes:
+                    to_extract.append((extractor, path))
+                    continue
+            except OSError:
+                pass
+            texts[path] = None
+
+        # path -> (async result, extractor, start time). No more than one
+        # per process, so an extraction starts when it is handed over.
+        running = {}
+        while len(to_extract) > 0 or len(running) > 0:
+            if is_cancelled is not None and is_cancelled():
+                # The running extractions are stopped with the pool
+                if len(running) > 0:
+                    self.close()
+                break
+            if self.pool is None:
+                # Workers are replaced now and then, extraction libraries leak
+                self.pool = multiprocessing.Pool(self.processes, maxtasksperchild=100)
+            while len(to_extract) > 0 and len(running) < self.processes:
+                extractor, path = to_extract.popleft()
+                running[path] = (self.pool.apply_async(
+                                     extract, (extractor, path, self.max_characters, self.seconds)),
+                                 extractor, time.monotonic())
+            oldest_start = min(start for result, extractor, start in running.values())
+            next(iter(running.values()))[0].wait(
+                max(0, min(self.poll_interval, oldest_start + self.seconds - time.monotonic())))
+
+            now = time.monotonic()
+            is_hanging = False
+            for path, (result, extractor, start) in list(running.items()):
+                if result.ready():
+                    del running[path]
+                    texts[path] = result.get()[1]
+                elif now > start + self.seconds:
+                    del running[path]
+                    timed_out_paths.append(path)
+                    is_hanging = True
+            if is_hanging:
+                # The hanging worker can only be stopped with the pool
+                self.close()
+                for path, (result, extractor, start) in running.items():
+                    to_extract.appendleft((extractor, path))
+                running = {}
+        return texts, timed_out_paths
@@ -0,0 +1,135 @@
+import hashlib
+import os
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class FileHashes(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    partial_hash: Optional[str]
+    # None until the partial hash had a match
+    full_hash: Optional[str]
+
+
+# Bytes read from the start and from the end for the partial hash
+partial_block_size = 64 * 1024
+full_hash_chunk_size = 1024 * 1024
+
+
+def partial_hash(path) -> Optional[str]:
+    # Hash of the first and last block, a file of up to two blocks is read
+    # completely, so its partial hash is also its full hash
+    try:
+        with open(path, "rb") as file:
+            file_hash = hashlib.blake2b(file.read(partial_block_size))
+            size = os.fstat(file.fileno()).st_size
+            if size > partial_block_size:
+                file.seek(max(partial_block_size, size - partial_block_size))
+                file_hash.update(file.read(partial_block_size))
+        return file_hash.hexdigest()
+    except OSError:
+        return None
+
+
+def full_hash(path) -> Optional[str]:
+    # Runs in the worker processes of find_duplicates
+    try:
+        with open(path, "rb") as file:
+            file_hash = hashlib.blake2b()
+            buffer = bytearray(full_hash_chunk_size)
+            view = memoryview(buffer)
+            while True:
+                count = file.readinto(buffer)
+                if count == 0:
+                    break
+                file_hash.update(view[:count])
+        return file_hash.hexdigest()
+    except OSError:
+        return None
+
+
+def group_by(items, key) -> List[list]:
+    # Groups of at least two items with the same key, None keys are dropped
+    groups = defaultdict(list)
+    for item in items:
+        item_key = key(item)
+        if item_key is not None:
+            groups[item_key].append(item)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+# Finds files with the same content. Candidates are grouped by size first,
+# then by a hash of their first and last block and only files still in a
+# group by then are hashed completely, in a process pool. Hashes are cached
+# by path and only reused while size and mtime match.
+class DuplicateFinder():
+    def __init__(self, max_threads=8, max_processes=None):
+        self.max_threads = max_threads
+        if max_processes is None:
+            max_processes = min(4, os.cpu_count() or 1)
+        self.max_processes = max_processes
+
+    def find(self, files: Iterable[Tuple[str, int, float]],
+             cached_hashes: Callable[[List[str]], Dict[str, FileHashes]] = None,
+             is_candidate=None) -> Tuple[List[List[str]], List[FileHashes]]:
+        # files are (path, size, mtime). cached_hashes(paths) returns the
+        # cached hashes of the candidates. With is_candidate(path) only
+        # groups with at least one such file are looked at. Returns the
+        # groups of duplicate paths and the hashes to cache.
+        size_groups = [group for group in group_by(
+            (file for file in files if file[1] > 0), key=lambda file: file[1])
+            if is_candidate is None or any(is_candidate(file[0]) for file in group)]
+
+        cached = {}
+        if cached_hashes is not None:
+            cached = cached_hashes(
+                [path for group in size_groups for path, size, mtime in group])
+        hashes = {}
+        to_hash = []
+        for group in size_groups:
+            for path, size, mtime in group:
+                known = cached.get(path)
+                if known is not None and known.size == size and known.mtime == mtime:
+                    hashes[path] = known
+                else:
+                    hashes[path] = FileHashes(path, size, mtime, None, None)
+                    to_hash.append(path)
+        changed = set(to_hash)
+
+        with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
+            for path, file_partial_hash in zip(to_hash, executor.map(partial_hash, to_hash)):
+                hashes[path] = hashes[path]._replace(partial_hash=file_partial_hash)
+
+        partial_groups = [group for size_group in size_groups for group in group_by(
+            (hashes[path] for path, size, mtime in size_group),
+            key=lambda file_hashes: file_hashes.partial_hash)]
+
+        to_hash = []
+        for group in partial_groups:
+            for file_hashes in group:
+                if file_hashes.size <= 2 * partial_block_size:
+                    # Read completely already
+                    if file_hashes.full_hash is None:
+                        hashes[file_hashes.path] = file_hashes._replace(
+                            full_hash=file_hashes.partial_hash)
+                        changed.add(file_hashes.path)
+                elif file_hashes.full_hash is None:
+                    to_hash.append(file_hashes.path)
+        if len(to_hash) > 0:
+            with ProcessPoolExecutor(max_workers=self.max_processes) as executor:
+                for path, file_full_hash in zip(to_hash, executor.map(full_hash, to_hash)):
+                    hashes[path] = hashes[path]._replace(full_hash=file_full_hash)
+                    changed.add(path)
+
+        duplicates = [sorted(file_hashes.path for file_hashes in group)
+                      for partial_group in partial_groups
+                      for group in group_by(
+                          (hashes[file_hashes.path] for file_hashes in partial_group),
+                          key=lambda file_hashes: file_hashes.full_hash)]
+        duplicates.sort()
+        return duplicates, [hashes[path] for path in changed
+                            if hashes[path].partial_hash is not None]
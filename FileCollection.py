@@ -1,76 +1,331 @@
+import argparse
+import json
 import os
 import os.path
-import userpaths
-import magic
+import sys
+import threading
+import time
 
+try:
+    import userpaths
+except ImportError:
+    # Not on Windows, see default_user_files_path
+    userpaths = None
 
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
+from typing import List, NamedTuple, Optional
 
-from typing import Tuple
-from winreg import HKEYType, ConnectRegistry, HKEY_LOCAL_MACHINE, OpenKey, QueryValueEx
+from ContentExtractor import ContentExtractor
+from DuplicateFinder import DuplicateFinder
+from FileCrawler import FileCrawler, FileRecord
+from FileManifest import FileManifest
+from FileTypeResolver import FileTypeResolver
+from SearchResultCache import SearchResultCache
 
 from whoosh import index
-from whoosh.fields import SchemaClass, TEXT, ID, NUMERIC, DATETIME
+from whoosh.fields import SchemaClass, TEXT, ID, NGRAM, NUMERIC, DATETIME
 from whoosh.qparser import QueryParser
-from whoosh.query import And
+from whoosh.query import And, Every, Or, Prefix, Term
+
+
+def default_user_files_path() -> str:
+    if userpaths is not None:
+        return userpaths.get_my_documents()
+    return os.path.join(os.path.expanduser("~"), "Documents")
+
+
+def default_user_index_path(app_name) -> str:
+    if userpaths is not None:
+        return os.path.join(userpaths.get_local_appdata(), app_name)
+    data_home = os.environ.get("XDG_DATA_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(data_home, app_name)
+
+
+class IndexUnavailableError(Exception):
+    # Raised by FileCollection(open_only=True) for a missing index or one
+    # of an older schema
+    pass
 
 
 class FileCollectionSchema(SchemaClass):
     path_with_file_name = ID(stored=True)
     path = TEXT(stored=True)
-    file_name_with_extension = TEXT(stored=True)
-    file_name = TEXT(stored=True)
-    file_size = NUMERIC(stored=True)
-    file_type = TEXT(stored=True)
-    last_modified = DATETIME(stored=True)
+    # Untokenized parent folder for exact folder lookups
+    parent_path = ID()
+    file_name_with_extension = TEXT(stored=True, sortable=True)
+    # Trigrams of the file name for substring search
+    file_name_ngrams = NGRAM(minsize=3, maxsize=3)
+    # Sortable fields are the sort keys of paged search results
+    file_name = TEXT(stored=True, sortable=True)
+    file_size = NUMERIC(stored=True, sortable=True)
+    file_type = TEXT(stored=True, sortable=True)
+    last_modified = DATETIME(stored=True, sortable=True)
+    # Text of the file, filled in by index_file_contents. Not stored, it
+    # is only searched.
+    content = TEXT()
+
+
+# Change of one file for the rows shown by the GUI, row holds the stored
+# fields of the inserted or updated document
+class FileRowDelta(NamedTuple):
+    kind: str
+    path_with_file_name: str
+    row: Optional[dict]
+
+    insert = "insert"
+    update = "update"
+    remove = "remove"
+
+
+# Handle on the hits of a search. Only the document numbers are collected,
+# stored fields are read when a page is fetched. Hits served from the
+# search cache come as rows instead, without a searcher.
+class FileSearchResults():
+    # What was searched, set by FileCollection.search_paged
+    search_path: str = None
+    filename_search_value: str = ""
+    is_exact_path_search: bool = True
+    search_contents: bool = False
+
+    def __init__(self, searcher, docnums, sort_key=None, reverse=False,
+                 file_names=None, searcher_references=None, rows=None):
+        self.searcher = searcher
+        self.docnums = docnums
+        self.rows = rows
+        self.sort_key = sort_key
+        self.reverse = reverse
+        # Lower case file names of the hits, parallel to the hits. Only kept
+        # for file name searches, to refine them without the index.
+        self.file_names = file_names
+        # Refined results share the searcher, the last one closes it
+        if searcher_references is None:
+            searcher_references = [1]
+        self.searcher_references = searcher_references
+        self.is_closed = False
+
+    @property
+    def total(self) -> int:
+        if self.rows is not None:
+            return len(self.rows)
+        return len(self.docnums)
 
+    def fetch(self, start, count) -> List[dict]:
+        if self.rows is not None:
+            return self.rows[start:start + count]
+        return [self.searcher.stored_fields(docnum)
+                for docnum in self.docnums[start:start + count]]
 
-# Windows application names from extension
-class ExtensionQuery:
-    def __init__(self):
-        self.base: str = r"SOFTWARE\Classes"
-        self.reg: HKEYType = ConnectRegistry(None, HKEY_LOCAL_MACHINE)
+    def page(self, page_number, page_size) -> List[dict]:
+        return self.fetch(page_number * page_size, page_size)
 
-    def _get_value_from_class(self, class_str: str) -> str:
-        path: str = fr"{self.base}\{class_str}"
-        key: HKEYType = OpenKey(self.reg, path)
-        value_tuple: Tuple[str, int] = QueryValueEx(key, "")
-        return value_tuple[0]
+    def matches(self, path, is_hit=False) -> bool:
+        # Whether the file at path belongs to this search. is_hit tells if it
+        # was a hit so far, a content hit whose name doesn't contain the
+        # value stays one.
+        parent_path = str(Path(path).parent)
+        file_name = os.path.basename(path).lower()
+        if self.search_contents and is_hit:
+            return SearchResultCache.covers(
+                (self.search_path, "", self.is_exact_path_search), parent_path, file_name)
+        return SearchResultCache.covers(
+            (self.search_path, self.filename_search_value, self.is_exact_path_search),
+            parent_path, file_name)
 
-    def get_application_name(self, ext: str) -> str:
-        return self._get_value_from_class(self._get_value_from_class(ext))
+    def refine(self, filename_search_value) -> "FileSearchResults":
+        # Hits whose file name also contains filename_search_value, in the
+        # same order
+        value = filename_search_value.lower()
+        hits = [i for i, file_name in enumerate(self.file_names) if value in file_name]
+        docnums = None
+        if self.docnums is not None:
+            docnums = [self.docnums[i] for i in hits]
+        rows = None
+        if self.rows is not None:
+            rows = [self.rows[i] for i in hits]
+        self.searcher_references[0] += 1
+        results = FileSearchResults(
+            self.searcher, docnums, self.sort_key, self.reverse,
+            [self.file_names[i] for i in hits], self.searcher_references, rows)
+        results.search_path = self.search_path
+        results.filename_search_value = filename_search_value
+        results.is_exact_path_search = self.is_exact_path_search
+        return results
+
+    def close(self):
+        if self.is_closed:
+            return
+        self.is_closed = True
+        self.searcher_references[0] -= 1
+        if self.searcher_references[0] == 0 and self.searcher is not None:
+            self.searcher.close()
 
 
 class FileCollection():
     ix: index.FileIndex
-    windows_file_type_determiner = ExtensionQuery()
-    mime_type_determiner = magic.Magic(mime=True)
+    file_type_resolver: FileTypeResolver
     path_to_user_index: str
     path_to_user_files: str
+    is_new_index: bool
+    manifest: FileManifest
+    file_crawler = FileCrawler()
     dir_tree = {}
-    file_paths = []
 
-    def __init__(self, app_name):
-        self.path_to_user_index = userpaths.get_local_appdata() + os.path.sep + app_name
-        self.path_to_user_files = userpaths.get_my_documents()
+    # Increase on every change of FileCollectionSchema
+    schema_version: int = 5
+
+    # Size of the file name n-grams of file_name_ngrams
+    ngram_size: int = 3
+
+    # Streaming build: commit a segment every N documents or M megabytes,
+    # None disables the limit
+    commit_every_documents: int = 5000
+    commit_every_megabytes: float = 32
+    # Number of processes analysing documents during a cold build,
+    # 1 builds serially
+    index_processes: int = 1
+    # Reuse the listing of folders whose mtime didn't change on warm starts
+    prune_unchanged_directories: bool = True
+    # Number of files whose types are resolved together while indexing
+    file_type_batch_size: int = 256
+    # Index files that need content sniffing with a placeholder type first,
+    # enrich_file_types fills in the sniffed type afterwards
+    defer_file_type_sniffing: bool = False
+    file_type_enrichment_batch_size: int = 100
+    # Seconds to pause between enrichment batches
+    file_type_enrichment_pause: float = 0.2
+    # Seconds to wait for the index write lock held by another writer
+    writer_timeout: float = 10.0
+    # Searches with up to this many hits are kept in memory, in an LRU of
+    # at most search_cache_megabytes
+    search_cache_max_rows: int = 5000
+    search_cache_megabytes: float = 16
+    search_cache: SearchResultCache
+    # Index the text of files with an extractor, see ContentExtractor
+    content_indexing: bool = True
+    content_batch_size: int = 50
+    # Files above this size aren't read, longer texts are cut
+    content_max_file_megabytes: float = 20
+    content_max_characters: int = 200000
+    # Seconds an extractor gets per file
+    content_extraction_seconds: float = 10.0
+    # Worker processes of the extraction, None for up to 4
+    content_processes: int = None
+    # Seconds to pause between content batches
+    content_indexing_pause: float = 0.2
+    # Files whose extraction took too long this often are indexed without
+    # content until they change
+    content_max_timeouts: int = 3
+    # Set by stop_background_work, ends the background passes after their
+    # current batch
+    stop_event: threading.Event
+    duplicate_finder: DuplicateFinder
+
+    def __init__(self, app_name, path_to_user_files=None, path_to_user_index=None,
+                 open_only=False):
+        # With open_only an existing index is opened as it is, nothing is
+        # created or rebuilt
+        if path_to_user_index is None:
+            path_to_user_index = default_user_index_path(app_name)
+        if path_to_user_files is None:
+            path_to_user_files = default_user_files_path()
+        self.path_to_user_index = path_to_user_index
+        self.path_to_user_files = path_to_user_files
+
+        path_to_manifest = os.path.join(self.path_to_user_index, FileManifest.file_name)
+        if open_only and not (os.path.exists(path_to_manifest) and
+                              index.exists_in(self.path_to_user_index)):
+            raise IndexUnavailableError(f"No index in {self.path_to_user_index}")
+        if not os.path.exists(self.path_to_user_index):
+            os.makedirs(self.path_to_user_index)
+
+        self.manifest = FileManifest(path_to_manifest)
+        # An index with an older schema is rebuilt from scratch
+        if index.exists_in(self.path_to_user_index) and \
+                self.manifest.get_meta("schema_version") == str(self.schema_version):
+            self.ix = index.open_dir(self.path_to_user_index)
+            self.is_new_index = False
+        elif open_only:
+            raise IndexUnavailableError(
+                f"The index in {self.path_to_user_index} has an older schema, "
+                f"it is rebuilt by the next index run")
+        else:
+            self.ix = index.create_in(
+                self.path_to_user_index, FileCollectionSchema)
+            self.manifest.clear()
+            self.manifest.set_meta("schema_version", str(self.schema_version))
+            self.is_new_index = True
+        self.file_type_resolver = FileTypeResolver(os.path.join(
+            self.path_to_user_index, FileTypeResolver.file_name))
+        self.search_cache = SearchResultCache(self.search_cache_megabytes)
+        self.duplicate_finder = DuplicateFinder()
+        self.stop_event = threading.Event()
+
+    def stop_background_work(self):
+        # E.g. when the app is closed
+        self.stop_event.set()
+
+    def build_index(self, progress_callback=None):
+        # progress_callback gets the number of indexed documents after every
+        # committed segment, so already committed files are searchable
 
-        def set_paths(path):
-            for root, dirs, filenames in os.walk(path):
-                for filename in filenames:
-                    self.file_paths.append(os.path.join(root, filename))
+        # Directory records of the crawl, written to the manifest once all
+        # files are indexed
+        directories = []
 
         def init_index():
-            writer = self.ix.writer()
-            for path in self.file_paths:
-                self.add_doc_to_index(writer, path)
-            writer.commit()
+            self.manifest.clear()
+            self.index_records(self.file_crawler.crawl(
+                self.path_to_user_files, directories=directories),
+                progress_callback, procs=self.index_processes)
+            if self.index_processes > 1:
+                # Every process wrote its own segments, merge them once
+                self.ix.optimize()
+            self.manifest.replace_directories(directories)
+            self.manifest.set_complete(True)
 
         def increment_index():
+            # Compare a fresh crawl against the manifest of the last run.
+            # Folders whose mtime didn't change aren't listed again, only
+            # their known files are stat'ed to catch edits in place.
+            snapshot = self.manifest.snapshot()
+            cached_listings = None
+            if self.prune_unchanged_directories:
+                cached_listings = self.manifest.listings(snapshot)
+            diff = self.manifest.diff(self.file_crawler.crawl(
+                self.path_to_user_files, cached_listings, directories), snapshot)
+
+            if len(diff.removed) > 0:
+                writer = self.ix.writer()
+                for path in diff.removed:
+                    writer.delete_by_term('path_with_file_name', path)
+                writer.commit()
+                self.search_cache.invalidate(diff.removed)
+                self.manifest.remove(diff.removed)
+
+            # Changed files replace their old document. Added files do so as
+            # well in case the index got ahead of the manifest.
+            self.index_records(diff.changed + diff.added,
+                               progress_callback, replace=True)
+            self.manifest.replace_directories(directories)
+
+        def increment_index_from_stored_fields():
+            # Index without a complete manifest, e.g. created by an older
+            # version. Compare against the stored fields once and write the
+            # manifest afterwards.
+            # All files currently in the filesystem, stat'ed once by the crawler
+            file_records = {record.path: record for record in
+                            self.file_crawler.crawl(self.path_to_user_files,
+                                                    directories=directories)}
             # The set of all paths in the index
             indexed_paths = set()
             # The set of all paths we need to re-index
             to_index = set()
+            # Kept documents with the placeholder type, e.g. of an
+            # interrupted build that deferred sniffing
+            unknown_type_paths = []
 
             with self.ix.searcher() as searcher:
                 writer = self.ix.writer()
@@ -80,7 +335,7 @@ class FileCollection():
                     indexed_path = fields['path_with_file_name']
                     indexed_paths.add(indexed_path)
 
-                    if not os.path.exists(indexed_path):
+                    if indexed_path not in file_records:
                         # This file was deleted since it was indexed
                         writer.delete_by_term(
                             'path_with_file_name', indexed_path)
@@ -91,48 +346,306 @@ class FileCollection():
                         indexed_time: datetime
                         indexed_time = fields['last_modified']
                         mtime = datetime.fromtimestamp(
-                            os.path.getmtime(indexed_path)).timestamp()
+                            file_records[indexed_path].mtime).timestamp()
                         if mtime > indexed_time.timestamp():
                             # The file has changed, delete it and add it to the list of
                             # files to reindex
                             writer.delete_by_term(
                                 'path_with_file_name', indexed_path)
                             to_index.add(indexed_path)
+                        elif fields['file_type'] == FileTypeResolver.unknown_file_type:
+                            unknown_type_paths.append(indexed_path)
+
+            # Loop over the files in the filesystem. These are either files
+            # that changed, or new files that weren't indexed before.
+            # The deletions are committed together with the first segment.
+            self.manifest.clear()
+            # Cleared with the manifest, sniffed again by enrich_file_types
+            self.manifest.add_pending_file_types(unknown_type_paths)
+            self.index_records(
+                (record for path, record in file_records.items()
+                 if path in to_index or path not in indexed_paths),
+                progress_callback, writer)
+            self.manifest.update(file_records.values())
+            self.manifest.replace_directories(directories)
+            self.manifest.set_complete(True)
+
+        if self.is_new_index:
+            init_index()
+            self.is_new_index = False
+        elif self.manifest.is_complete():
+            increment_index()
+        else:
+            increment_index_from_stored_fields()
+        self.file_type_resolver.save()
+        # The crawl listed every folder already
+        self.set_dir_tree(directory.path for directory in directories)
+
+    def index_records(self, records, progress_callback=None, writer=None, procs=1,
+                      replace=False, defer_file_type_sniffing=None):
+        # With procs > 1 the analysis is spread over that many processes
+        # and each of them writes its own segment, so the segment limits
+        # apply per process.
+        # With replace=True an existing document of the same path is deleted
+        # first. The manifest is updated after every commit.
+        if defer_file_type_sniffing is None:
+            defer_file_type_sniffing = self.defer_file_type_sniffing
+        documents_indexed = 0
+        segment_records = []
+        segment_pending_paths = []
+        bytes_in_segment = 0
+        # One searcher per writer for all deletes, delete_by_term opens one
+        # per call otherwise
+        searcher = None
+        records = iter(records)
+        while True:
+            # File types are resolved per batch, so files that need content
+            # sniffing are sniffed in parallel
+            batch = list(islice(records, self.file_type_batch_size))
+            if len(batch) == 0:
+                break
+            file_type_names = self.file_type_resolver.resolve_many(
+                [record.path for record in batch],
+                sniff=not defer_file_type_sniffing)
+
+            for record, file_type_name in zip(batch, file_type_names):
+                if file_type_name is None:
+                    # Sniffed later by enrich_file_types
+                    file_type_name = FileTypeResolver.unknown_file_type
+                    segment_pending_paths.append(record.path)
+                if writer is None:
+                    if procs > 1:
+                        writer = self.ix.writer(procs=procs, multisegment=True)
+                    else:
+                        writer = self.ix.writer()
+                if replace:
+                    if searcher is None:
+                        searcher = writer.searcher()
+                    writer.delete_by_term('path_with_file_name', record.path,
+                                          searcher=searcher)
+                self.add_doc_to_index(
+                    writer, record.path, record.size, record.mtime, file_type_name)
+                segment_records.append(record)
+                bytes_in_segment += self._estimate_doc_bytes(record.path)
 
-                # Loop over the files in the filesystem
-                # Assume we have a function that gathers the filenames of the
-                # documents to be indexed
-                for path in self.file_paths:
-                    if path in to_index or path not in indexed_paths:
-                        # This is either a file that's changed, or a new file
-                        # that wasn't indexed before. So index it!
-                        self.add_doc_to_index(writer, path)
+                if self.commit_every_documents is not None and \
+                        len(segment_records) >= self.commit_every_documents * procs or \
+                        self.commit_every_megabytes is not None and \
+                        bytes_in_segment >= self.commit_every_megabytes * 1024 * 1024 * procs:
+                    if searcher is not None:
+                        searcher.close()
+                        searcher = None
+                    writer.commit()
+                    writer = None
+                    self.search_cache.invalidate(
+                        record.path for record in segment_records)
+                    self.manifest.update(segment_records)
+                    self.manifest.add_pending_file_types(segment_pending_paths)
+                    documents_indexed += len(segment_records)
+                    segment_records = []
+                    segment_pending_paths = []
+                    bytes_in_segment = 0
+                    if progress_callback is not None:
+                        progress_callback.emit(documents_indexed)
 
+        if searcher is not None:
+            searcher.close()
+        if writer is not None:
             writer.commit()
+            self.search_cache.invalidate(
+                record.path for record in segment_records)
+            self.manifest.update(segment_records)
+            self.manifest.add_pending_file_types(segment_pending_paths)
+            documents_indexed += len(segment_records)
+            if progress_callback is not None and len(segment_records) > 0:
+                progress_callback.emit(documents_indexed)
+        return documents_indexed
 
-        if not os.path.exists(self.path_to_user_index):
-            os.mkdir(self.path_to_user_index)
+    def enrich_file_types(self, progress_callback=None):
+        # Background pass for defer_file_type_sniffing: sniff the content of
+        # the files indexed with the placeholder type and update their
+        # documents batch by batch, pausing in between to throttle the I/O
+        documents_enriched = 0
+        while not self.stop_event.is_set():
+            paths = self.manifest.pending_file_types(
+                self.file_type_enrichment_batch_size)
+            if len(paths) == 0:
+                break
+            file_type_names = [self.file_type_resolver.sniff(path)
+                               for path in paths]
 
-        set_paths(self.path_to_user_files)
-        if index.exists_in(self.path_to_user_index):
-            self.ix = index.open_dir(self.path_to_user_index)
-            increment_index()
-        else:
-            self.ix = index.create_in(
-                self.path_to_user_index, FileCollectionSchema)
-            init_index()
+            writer = self.ix.writer(timeout=self.writer_timeout)
+            with writer.searcher() as searcher:
+                records, removed_paths, _ = self._rewrite_documents(
+                    writer, searcher,
+                    [(path, path, file_type_name, None)
+                     for path, file_type_name in zip(paths, file_type_names)])
+            writer.commit()
+            self.search_cache.invalidate(
+                removed_paths + [record.path for record in records])
+            self.manifest.remove(removed_paths)
+            self.manifest.update(records)
+            self.manifest.remove_pending_file_types(paths)
+
+            documents_enriched += len(paths)
+            if progress_callback is not None:
+                progress_callback.emit(documents_enriched)
+            self.stop_event.wait(self.file_type_enrichment_pause)
+        return documents_enriched
+
+    def index_file_contents(self, progress_callback=None):
+        # Background pass after enrich_file_types: extracts the text of the
+        # files whose content wasn't indexed at their current mtime yet and
+        # rewrites their documents with it, batch by batch
+        if not self.content_indexing:
+            return 0
+        paths = self.manifest.content_candidates()
+        documents_processed = 0
+        with ContentExtractor(self.content_processes, self.content_max_file_megabytes,
+                              self.content_max_characters,
+                              self.content_extraction_seconds) as content_extractor:
+            for start in range(0, len(paths), self.content_batch_size):
+                if self.stop_event.is_set():
+                    break
+                batch = paths[start:start + self.content_batch_size]
+                texts, timed_out_paths = content_extractor.extract_many(
+                    [path for path, mtime in batch], self.stop_event.is_set)
+
+                writer = self.ix.writer(timeout=self.writer_timeout)
+                with writer.searcher() as searcher:
+                    records, removed_paths, _ = self._rewrite_documents(
+                        writer, searcher,
+                        [(path, path, None, text) for path, text in texts.items() if text])
+                writer.commit()
+                self.search_cache.invalidate(
+                    removed_paths + [record.path for record in records])
+                self.manifest.remove(removed_paths)
+                self.manifest.update(records)
+                # Files without text are skipped as well until they change,
+                # ones that took too long are tried again by the next passes
+                # until content_max_timeouts
+                content_mtimes = {path: mtime for path, mtime in batch if path in texts}
+                timeouts = self.manifest.count_content_timeouts(
+                    (path, mtime) for path, mtime in batch if path in timed_out_paths)
+                content_mtimes.update(
+                    (path, mtime) for path, mtime in batch
+                    if timeouts.get(path, 0) >= self.content_max_timeouts)
+                content_mtimes.update((record.path, record.mtime) for record in records)
+                self.manifest.set_file_contents(content_mtimes.items())
+
+                documents_processed += len(batch)
+                if progress_callback is not None:
+                    progress_callback.emit(documents_processed)
+                self.stop_event.wait(self.content_indexing_pause)
+        return documents_processed
 
-    def refresh_dir_tree(self):
+    @staticmethod
+    def _estimate_doc_bytes(path):
+        # The path ends up in four text fields (stored and as terms), the
+        # numeric, date and file type fields are roughly constant
+        return 4 * len(path) + 128
+
+    def sub_dirs(self, path) -> List[str]:
+        # Names of the subfolders of path. dir_tree is the listing cache,
+        # folders missing there are listed and added to it.
+        sub_dirs = self.dir_tree.get(path)
+        if sub_dirs is None:
+            try:
+                with os.scandir(path) as entries:
+                    # Same as os.walk: symlinked folders are not followed
+                    sub_dirs = [entry.name for entry in entries
+                                if entry.is_dir() and not entry.is_symlink()]
+            except OSError:
+                sub_dirs = []
+            self.dir_tree[path] = sub_dirs
+        return sub_dirs
+
+    def set_dir_tree(self, directory_paths):
         self.dir_tree.clear()
-        for root, dirs, filenames in os.walk(self.path_to_user_files):
+        directory_paths = sorted(directory_paths)
+        for path in directory_paths:
+            self.dir_tree[path] = []
+        for path in directory_paths:
+            parent = os.path.dirname(path)
+            if path != self.path_to_user_files and parent in self.dir_tree:
+                self.dir_tree[parent].append(os.path.basename(path))
+
+    # The folder events of the file watcher update dir_tree in place. Each
+    # returns the folders that were added to or removed from the tree,
+    # parents before their subfolders.
+
+    def add_dir_to_tree(self, path) -> List[str]:
+        parent = os.path.dirname(path)
+        if parent not in self.dir_tree or path in self.dir_tree:
+            return []
+        added = []
+        # Only the new folder is walked, it may come with subfolders
+        for root, dirs, filenames in os.walk(path):
             self.dir_tree[root] = dirs
+            added.append(root)
+        if len(added) > 0:
+            self.dir_tree[parent].append(os.path.basename(path))
+        return added
 
-    def add_doc_to_index(self, writer, path):
-        try:
-            file_type_name = self.windows_file_type_determiner.get_application_name(
-                os.path.splitext(path)[1])
-        except:
-            file_type_name = self.mime_type_determiner.from_file(path)
+    def remove_dir_from_tree(self, path) -> List[str]:
+        if path not in self.dir_tree or path == self.path_to_user_files:
+            return []
+        removed = []
+        to_remove = [path]
+        while len(to_remove) > 0:
+            removed_path = to_remove.pop()
+            removed.append(removed_path)
+            to_remove.extend(os.path.join(removed_path, child)
+                             for child in self.dir_tree.pop(removed_path, []))
+        siblings = self.dir_tree.get(os.path.dirname(path))
+        if siblings is not None and os.path.basename(path) in siblings:
+            siblings.remove(os.path.basename(path))
+        return removed
+
+    def move_dir_in_tree(self, src_path, dest_path) -> List[str]:
+        # Returns the moved folders under their new paths, the subtree is
+        # re-keyed without listing it again
+        if src_path not in self.dir_tree:
+            return self.add_dir_to_tree(dest_path)
+        subtree = []
+        to_move = [src_path]
+        while len(to_move) > 0:
+            moving_path = to_move.pop()
+            children = self.dir_tree[moving_path]
+            subtree.append((moving_path, children))
+            to_move.extend(os.path.join(moving_path, child) for child in children)
+        self.remove_dir_from_tree(src_path)
+        dest_parent = os.path.dirname(dest_path)
+        if dest_parent not in self.dir_tree:
+            # Moved out of the user files
+            return []
+        moved = []
+        for moved_path, children in subtree:
+            moved_path = dest_path + moved_path[len(src_path):]
+            self.dir_tree[moved_path] = children
+            moved.append(moved_path)
+        self.dir_tree[dest_parent].append(os.path.basename(dest_path))
+        return moved
+
+    @staticmethod
+    def stat_record(path) -> FileRecord:
+        stat_result = os.stat(path)
+        return FileRecord(path, stat_result.st_size, stat_result.st_mtime,
+                          stat_result.st_ino)
+
+    def add_doc_to_index(self, writer, path, size=None, mtime=None, file_type_name=None,
+                         content=None):
+        # Size, mtime and file type can be passed in from the crawler and a
+        # batched type resolution to avoid another stat and lookup. Without
+        # content the document is written without text, index_file_contents
+        # extracts it again.
+        if size is None or mtime is None:
+            record = self.stat_record(path)
+            size = record.size
+            mtime = record.mtime
+
+        if file_type_name is None:
+            file_type_name = self.file_type_resolver.resolve(path)
 
         if writer is None:
             writer = self.ix.writer()
@@ -140,60 +653,427 @@ class FileCollection():
         writer.add_document(
             path_with_file_name=path,
             path=str(Path(path).parent),
+            parent_path=str(Path(path).parent),
             file_name_with_extension=os.path.basename(path),
+            file_name_ngrams=os.path.basename(path),
             file_name=os.path.splitext(os.path.basename(path))[0],
-            file_size=os.path.getsize(path) / 1000,
+            file_size=size / 1000,
             file_type=file_type_name,
-            last_modified=datetime.fromtimestamp(os.path.getmtime(path)))
+            last_modified=datetime.fromtimestamp(mtime),
+            content=content)
         return writer
 
-    def update_doc_to_index(self, old_path, new_path):
-        writer = self.ix.writer()
-        # with self.ix.writer() as writer:
-        writer.delete_by_term("path_with_file_name", old_path)
-        self.add_doc_to_index(writer, new_path)
-        writer.commit()
+    def apply_file_changes(self, changed_paths, deleted_paths) -> List[FileRowDelta]:
+        # Coalesced changes of the file watcher in one writer: changed paths
+        # are (re)indexed, deleted ones removed. Returns the changes as row
+        # deltas for the GUI.
+        records = []
+        deleted_paths = list(deleted_paths)
+        for path in changed_paths:
+            try:
+                records.append(self.stat_record(path))
+            except OSError:
+                # Gone again already
+                deleted_paths.append(path)
+        known_paths = self.manifest.known_paths(record.path for record in records)
 
-    def delete_doc_from_index(self, path):
-        writer = self.ix.writer()
-        # with self.ix.writer() as writer:
-        writer.delete_by_term("path_with_file_name", path)
-        writer.commit()
+        writer = self.ix.writer(timeout=self.writer_timeout)
+        with writer.searcher() as searcher:
+            for path in deleted_paths:
+                writer.delete_by_term("path_with_file_name", path, searcher=searcher)
+        # Files are sniffed right away, while the lock is held. A batch of
+        # the IndexWriterService can hold up to commit_every_documents paths.
+        self.index_records(
+            records, writer=writer, replace=True, defer_file_type_sniffing=False)
+        self.search_cache.invalidate(deleted_paths)
+        self.manifest.remove(deleted_paths)
+
+        deltas = [FileRowDelta(FileRowDelta.remove, path, None)
+                  for path in deleted_paths]
+        with self.ix.searcher() as searcher:
+            for record in records:
+                docnum = searcher.document_number(path_with_file_name=record.path)
+                if docnum is None:
+                    continue
+                kind = FileRowDelta.update if record.path in known_paths else FileRowDelta.insert
+                deltas.append(FileRowDelta(
+                    kind, record.path, searcher.stored_fields(docnum)))
+        return deltas
 
-    def search(self, search_path, filename_search_value, is_exact_path_search):
-        if search_path == self.path_to_user_files:
-            search_path = ""
+    def _rewrite_documents(self, writer, searcher, rewrites, add_missing=False):
+        # Replaces documents in one writer, searcher is writer.searcher(),
+        # delete_by_term opens one per call otherwise. rewrites are (path,
+        # new path, file type, content) tuples, a file type of None keeps
+        # the stored one. Documents that aren't in the index are skipped,
+        # with add_missing they are written with the placeholder type.
+        # Returns the records of the written documents, the paths whose
+        # document is gone (moved away or deleted meanwhile) and the new
+        # paths written with the placeholder type.
+        records = []
+        removed_paths = []
+        pending_paths = []
+        for path, new_path, file_type_name, content in rewrites:
+            docnum = searcher.document_number(path_with_file_name=path)
+            if docnum is None and not add_missing:
+                continue
+            if file_type_name is None and docnum is not None:
+                file_type_name = searcher.stored_fields(docnum)["file_type"]
+            writer.delete_by_term("path_with_file_name", path, searcher=searcher)
+            if new_path != path:
+                removed_paths.append(path)
+            try:
+                record = self.stat_record(new_path)
+            except OSError:
+                # Gone again already
+                removed_paths.append(new_path)
+                continue
+            if file_type_name is None or \
+                    file_type_name == FileTypeResolver.unknown_file_type:
+                # Not sniffed yet, done by enrich_file_types
+                file_type_name = FileTypeResolver.unknown_file_type
+                pending_paths.append(new_path)
+            self.add_doc_to_index(
+                writer, new_path, record.size, record.mtime, file_type_name, content)
+            records.append(record)
+        return records, removed_paths, pending_paths
 
-        hit_list = list()
+    def apply_file_moves(self, moves) -> List[FileRowDelta]:
+        # Files moved by the FileMover as (source, destination) pairs in one
+        # writer. The documents keep their file type, only the path changes,
+        # so nothing is sniffed again.
+        moves = list(moves)
+        if len(moves) == 0:
+            return []
+        known_paths = self.manifest.known_paths(dest_path for _, dest_path in moves)
+
+        writer = self.ix.writer(timeout=self.writer_timeout)
+        with writer.searcher() as searcher:
+            for source_path, dest_path in moves:
+                if dest_path in known_paths:
+                    # A file that was replaced at the destination
+                    writer.delete_by_term("path_with_file_name", dest_path, searcher=searcher)
+            records, deleted_paths, pending_paths = self._rewrite_documents(
+                writer, searcher,
+                [(source_path, dest_path, None, None) for source_path, dest_path in moves],
+                add_missing=True)
+        writer.commit()
+        self.search_cache.invalidate(
+            deleted_paths + [record.path for record in records])
+        self.manifest.move_file_hashes(moves)
+        self.manifest.remove(deleted_paths)
+        self.manifest.update(records)
+        self.manifest.add_pending_file_types(pending_paths)
+
+        deltas = [FileRowDelta(FileRowDelta.remove, path, None)
+                  for path in deleted_paths]
         with self.ix.searcher() as searcher:
-            if len(filename_search_value) > 0:
-                file_name_parser = QueryParser(
-                    "file_name_with_extension", schema=self.ix.schema)
-                file_name_query = file_name_parser.parse(
-                    "*" + filename_search_value + "*")
-
-            if len(search_path) > 0:
-                path_parser = QueryParser("path", schema=self.ix.schema)
-                path_query = path_parser.parse(search_path)
-
-            local_variables = locals()
-            if "file_name_query" in local_variables and "path_query" in local_variables:
-                final_query = And([file_name_query, path_query])
-            elif "file_name_query" in local_variables:
-                final_query = file_name_query
-            elif "path_query" in local_variables:
-                final_query = path_query
-            else:
-                search_path = self.path_to_user_files
-                final_query = QueryParser(
-                    "path", schema=self.ix.schema).parse("*")
-
-            results = searcher.search(final_query, limit=None)
-            for hit in results:
-                if is_exact_path_search == True:
-                    # exact search is probably not possible with whoosh so check manuely
-                    if hit["path"] == search_path:
-                        hit_list.append(dict(hit.items()))
-                else:
-                    hit_list.append(dict(hit.items()))
-            return hit_list
+            for record in records:
+                docnum = searcher.document_number(path_with_file_name=record.path)
+                kind = FileRowDelta.update if record.path in known_paths else FileRowDelta.insert
+                deltas.append(FileRowDelta(
+                    kind, record.path, searcher.stored_fields(docnum)))
+        return deltas
+
+    def find_duplicates(self, search_path="", is_exact_path_search=False) -> List[List[str]]:
+        # Groups of files with the same content, each with at least one file
+        # in search_path. The other files of a group can be anywhere.
+        if search_path == "":
+            search_path = self.path_to_user_files
+        search_key = (search_path, "", is_exact_path_search)
+        snapshot = self.manifest.snapshot()
+        duplicates, file_hashes = self.duplicate_finder.find(
+            ((path, size, mtime) for path, (size, mtime, inode) in snapshot.items()),
+            self.manifest.file_hashes,
+            lambda path: SearchResultCache.covers(
+                search_key, os.path.dirname(path), os.path.basename(path).lower()))
+        self.manifest.update_file_hashes(file_hashes)
+        return duplicates
+
+    def search(self, search_path, filename_search_value, is_exact_path_search,
+               search_contents=False):
+        results = self.search_paged(
+            search_path, filename_search_value, is_exact_path_search,
+            search_contents=search_contents)
+        try:
+            return results.fetch(0, results.total)
+        finally:
+            results.close()
+
+    def search_paged(self, search_path, filename_search_value, is_exact_path_search,
+                     sort_key=None, reverse=False, search_contents=False) -> FileSearchResults:
+        # The caller closes the returned results. With search_contents the
+        # file name value is also searched in the indexed content of the
+        # files.
+        if search_path == "":
+            search_path = self.path_to_user_files
+        search_contents = search_contents and len(filename_search_value) > 0
+
+        search_key = (search_path, filename_search_value, is_exact_path_search)
+        # Content searches aren't cached, the content of a file can be
+        # indexed without its path being invalidated
+        rows = None if search_contents else self.search_cache.get(search_key)
+        if rows is not None:
+            results = self.rows_to_results(rows, filename_search_value, sort_key, reverse)
+            results.search_path = search_path
+            results.filename_search_value = filename_search_value
+            results.is_exact_path_search = is_exact_path_search
+            return results
+        # Taken before searching, a change committed meanwhile keeps the
+        # hits out of the cache
+        cache_generation = self.search_cache.generation
+
+        queries = []
+        content_query = None
+        if search_contents:
+            content_query = QueryParser("content", schema=self.ix.schema).parse(
+                filename_search_value)
+            queries.append(Or([self.file_name_query(filename_search_value), content_query]))
+        elif len(filename_search_value) > 0:
+            queries.append(self.file_name_query(filename_search_value))
+
+        if is_exact_path_search == True:
+            # Term lookup of the folder's documents
+            queries.append(Term("parent_path", search_path))
+        elif search_path != self.path_to_user_files:
+            # The folder and all of its subfolders
+            queries.append(Or([Term("parent_path", search_path),
+                               Prefix("parent_path", search_path + os.path.sep)]))
+
+        if len(queries) == 0:
+            final_query = Every()
+        elif len(queries) == 1:
+            final_query = queries[0]
+        else:
+            final_query = And(queries)
+
+        searcher = self.ix.searcher()
+        # Relevance doesn't mean much for file names, so without a sort key
+        # the hits stay in index order and aren't scored
+        results = searcher.search(
+            final_query, limit=None, sortedby=sort_key, reverse=reverse,
+            scored=False)
+        docnums = [docnum for _, docnum in results.top_n]
+        file_names = None
+        if len(docnums) == 0:
+            # Also an empty index, which has no columns to read
+            if not search_contents and len(filename_search_value) >= self.ngram_size:
+                file_names = []
+        elif search_contents:
+            if len(filename_search_value) > self.ngram_size:
+                # Content hits are kept, name hits have to contain the value
+                content_docnums = set(searcher.docs_for_query(content_query))
+                file_name_column = searcher.reader().column_reader("file_name_with_extension")
+                value = filename_search_value.lower()
+                docnums = [docnum for docnum in docnums
+                           if docnum in content_docnums or
+                           value in file_name_column[docnum].lower()]
+        elif len(filename_search_value) >= self.ngram_size:
+            file_name_column = searcher.reader().column_reader("file_name_with_extension")
+            file_names = [file_name_column[docnum].lower() for docnum in docnums]
+            if len(filename_search_value) > self.ngram_size:
+                # All trigrams matching doesn't mean they are contiguous
+                value = filename_search_value.lower()
+                hits = [(docnum, file_name) for docnum, file_name in zip(docnums, file_names)
+                        if value in file_name]
+                docnums = [docnum for docnum, _ in hits]
+                file_names = [file_name for _, file_name in hits]
+        if len(docnums) <= self.search_cache_max_rows:
+            # Few enough hits to read them all right away, in index order
+            rows = [searcher.stored_fields(docnum) for docnum in sorted(docnums)]
+            searcher.close()
+            if not search_contents:
+                self.search_cache.put(search_key, rows, cache_generation)
+            # Content hits don't contain the value in their name, they can't
+            # be refined by it
+            results = self.rows_to_results(
+                rows, "" if search_contents else filename_search_value, sort_key, reverse)
+        else:
+            results = FileSearchResults(searcher, docnums, sort_key, reverse, file_names)
+        results.search_path = search_path
+        results.filename_search_value = filename_search_value
+        results.is_exact_path_search = is_exact_path_search
+        results.search_contents = search_contents
+        return results
+
+    def rows_to_results(self, rows, filename_search_value, sort_key=None, reverse=False) -> FileSearchResults:
+        if sort_key is not None:
+            rows = sorted(rows, key=lambda row: row[sort_key], reverse=reverse)
+        file_names = None
+        if len(filename_search_value) >= self.ngram_size:
+            file_names = [row["file_name_with_extension"].lower() for row in rows]
+        return FileSearchResults(None, None, sort_key, reverse, file_names, rows=rows)
+
+    def refine_search(self, results: FileSearchResults, search_path, filename_search_value,
+                      is_exact_path_search, sort_key=None, reverse=False,
+                      search_contents=False) -> Optional[FileSearchResults]:
+        # While typing, a file name value that extends the one of the
+        # previous results only narrows them down, so they are filtered in
+        # memory instead of searching the index again. None if the results
+        # can't be refined to the new search.
+        if search_path == "":
+            search_path = self.path_to_user_files
+        if search_contents or results is None or results.is_closed or results.file_names is None:
+            return None
+        if results.search_path != search_path or \
+                results.is_exact_path_search != is_exact_path_search or \
+                results.sort_key != sort_key or results.reverse != reverse:
+            return None
+        previous_value = results.filename_search_value.lower()
+        # Shorter values are matched by the wildcard query, which matches
+        # words instead of the whole file name
+        if len(previous_value) < self.ngram_size or \
+                previous_value not in filename_search_value.lower():
+            return None
+        return results.refine(filename_search_value)
+
+    def file_name_query(self, filename_search_value):
+        # Substring match through the trigrams of the file names. Values
+        # shorter than a trigram fall back to a wildcard query.
+        if len(filename_search_value) < self.ngram_size:
+            file_name_parser = QueryParser(
+                "file_name_with_extension", schema=self.ix.schema)
+            return file_name_parser.parse("*" + filename_search_value + "*")
+        trigrams = set(self.ix.schema["file_name_ngrams"].process_text(
+            filename_search_value, mode="query"))
+        return And([Term("file_name_ngrams", trigram) for trigram in sorted(trigrams)])
+
+
+# Command line: python -m FileCollection index|search|stats. Every output
+# line is a JSON object with an "event" key.
+
+def print_json_line(values):
+    print(json.dumps(values, default=str, ensure_ascii=False), flush=True)
+
+
+class ProgressPrinter():
+    # Stands in for the progress signal of the GUI workers
+    def __init__(self, event):
+        self.event = event
+
+    def emit(self, documents):
+        print_json_line({"event": self.event, "documents": documents})
+
+
+def run_index(file_collection: FileCollection, args):
+    file_collection.index_processes = args.processes
+    file_collection.defer_file_type_sniffing = args.defer_file_type_sniffing
+    is_new_index = file_collection.is_new_index
+    start = time.perf_counter()
+    file_collection.build_index(ProgressPrinter("progress"))
+    print_json_line({"event": "indexed", "documents": file_collection.ix.doc_count(),
+                     "is_new_index": is_new_index,
+                     "seconds": time.perf_counter() - start})
+    if args.defer_file_type_sniffing:
+        start = time.perf_counter()
+        file_collection.file_type_enrichment_pause = 0
+        documents = file_collection.enrich_file_types(ProgressPrinter("enrich_progress"))
+        print_json_line({"event": "enriched", "documents": documents,
+                         "seconds": time.perf_counter() - start})
+    if args.contents:
+        start = time.perf_counter()
+        file_collection.content_indexing_pause = 0
+        documents = file_collection.index_file_contents(ProgressPrinter("content_progress"))
+        print_json_line({"event": "contents_indexed", "documents": documents,
+                         "seconds": time.perf_counter() - start})
+
+
+def run_search(file_collection: FileCollection, args):
+    search_path = args.path
+    if search_path != "":
+        search_path = os.path.abspath(search_path)
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        results = file_collection.search_paged(
+            search_path, args.value, args.exact, args.sort, args.reverse, args.contents)
+        try:
+            rows = results.fetch(0, results.total if args.limit is None else args.limit)
+            total = results.total
+        finally:
+            results.close()
+        seconds = time.perf_counter() - start
+    for row in rows:
+        print_json_line(dict(row, event="hit"))
+    # seconds is the last repetition, later ones can be served by the cache
+    print_json_line({"event": "search", "value": args.value, "total": total,
+                     "returned": len(rows), "seconds": seconds})
+
+
+def run_stats(file_collection: FileCollection, args):
+    print_json_line(dict(
+        {"event": "stats",
+         "path_to_user_files": file_collection.path_to_user_files,
+         "path_to_user_index": file_collection.path_to_user_index,
+         "schema_version": file_collection.schema_version,
+         "is_new_index": file_collection.is_new_index,
+         "is_complete": file_collection.manifest.is_complete(),
+         "documents": file_collection.ix.doc_count(),
+         "index_bytes": sum(
+             os.path.getsize(os.path.join(file_collection.path_to_user_index, file_name))
+             for file_name in os.listdir(file_collection.path_to_user_index))},
+        **file_collection.manifest.table_counts()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m FileCollection",
+        description="Index and search the files of Woody's File Manager without the GUI")
+    parser.add_argument("--root", help="folder of the files, the documents folder by default")
+    parser.add_argument("--index", help="folder of the index, by default the one of the app")
+    parser.add_argument("--app-name", default="Woody´s File Manager",
+                        help="names the default index folder")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser(
+        "index", help="build the index, or bring it up to date")
+    index_parser.add_argument("--processes", type=int, default=1)
+    index_parser.add_argument("--defer-file-type-sniffing", action="store_true",
+                              help="sniff file types in a second pass")
+    index_parser.add_argument("--contents", action="store_true",
+                              help="also index the text of the files")
+
+    search_parser = subparsers.add_parser("search", help="search file names")
+    search_parser.add_argument("value", nargs="?", default="")
+    search_parser.add_argument("--path", default="",
+                               help="only files in this folder and its subfolders")
+    search_parser.add_argument("--exact", action="store_true",
+                               help="only files directly in --path, or the root")
+    search_parser.add_argument("--contents", action="store_true",
+                               help="also search the indexed text of the files")
+    search_parser.add_argument(
+        "--sort", choices=["file_name", "file_size", "file_type",
+                           "last_modified"])
+    search_parser.add_argument("--reverse", action="store_true")
+    search_parser.add_argument("--limit", type=int)
+    search_parser.add_argument("--repeat", type=int, default=1,
+                               help="run the search this many times, for its latency")
+
+    subparsers.add_parser("stats", help="size of the index and the manifest")
+
+    args = parser.parse_args(argv)
+    if args.command == "search" and args.repeat < 1:
+        parser.error("--repeat has to be at least 1")
+    # Indexed paths are absolute, like the ones of the GUI. Only index
+    # creates or rebuilds the index.
+    try:
+        file_collection = FileCollection(
+            args.app_name,
+            None if args.root is None else os.path.abspath(args.root),
+            None if args.index is None else os.path.abspath(args.index),
+            open_only=args.command != "index")
+    except IndexUnavailableError as error:
+        print_json_line({"event": "error", "message": str(error)})
+        return 1
+    try:
+        if args.command == "index":
+            run_index(file_collection, args)
+        elif args.command == "search":
+            run_search(file_collection, args)
+        elif args.command == "stats":
+            run_stats(file_collection, args)
+    finally:
+        file_collection.ix.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import os
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class FileRecord(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    # 0 on Windows, where the cached stat result has no file index
+    inode: int
+
+
+class DirectoryRecord(NamedTuple):
+    path: str
+    mtime: float
+    child_count: int
+
+
+class DirectoryListing(NamedTuple):
+    directory: DirectoryRecord
+    files: List[FileRecord]
+    sub_dirs: List[str]
+
+
+class FileCrawler():
+    max_workers: int
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            # Listing directories is mostly waiting on the file system,
+            # so use more threads than cores
+            max_workers = min(32, (os.cpu_count() or 1) * 4)
+        self.max_workers = max_workers
+
+    def crawl(self, root, cached_listings: Optional[Dict[str, DirectoryListing]] = None,
+              directories: Optional[List[DirectoryRecord]] = None) -> Iterator[FileRecord]:
+        # Every directory is listed in its own task, subdirectories found in
+        # a listing are fanned out to the pool and files are yielded as soon
+        # as their directory is done.
+        # A directory whose mtime matches its cached listing isn't listed
+        # again, the cached files and subdirectories are used instead. If
+        # given, directories collects a record of every crawled directory.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self._scan_dir, root, cached_listings)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    records, sub_dirs, directory = future.result()
+                    for sub_dir in sub_dirs:
+                        pending.add(executor.submit(
+                            self._scan_dir, sub_dir, cached_listings))
+                    if directories is not None and directory is not None:
+                        directories.append(directory)
+                    yield from records
+
+    def _scan_dir(self, path, cached_listings=None) -> Tuple[List[FileRecord], List[str], Optional[DirectoryRecord]]:
+        try:
+            # Taken before listing, so changes during the listing are seen
+            # by the next crawl
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return [], [], None
+
+        if cached_listings is not None:
+            cached = cached_listings.get(path)
+            # The child count guards against a cached listing that is
+            # incomplete, e.g. when the last build was interrupted
+            if cached is not None and cached.directory.mtime == mtime and \
+                    cached.directory.child_count == len(cached.files) + len(cached.sub_dirs):
+                # Editing a file in place doesn't change the folder's mtime,
+                # so the files are still stat'ed, only the listing is saved
+                records = []
+                for cached_record in cached.files:
+                    try:
+                        stat_result = os.stat(cached_record.path)
+                    except OSError:
+                        # Removed, the diff reports it
+                        continue
+                    records.append(cached_record._replace(
+                        size=stat_result.st_size, mtime=stat_result.st_mtime))
+                return records, cached.sub_dirs, cached.directory
+
+        records = []
+        sub_dirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            # Same as os.walk: symlinked folders are not followed
+                            if not entry.is_symlink():
+                                sub_dirs.append(entry.path)
+                            continue
+                        # DirEntry caches the stat result (on Windows it comes
+                        # with the listing itself), so this is the only stat
+                        stat_result = entry.stat()
+                    except OSError:
+                        # File vanished or is not accessible
+                        continue
+                    records.append(FileRecord(
+                        entry.path, stat_result.st_size, stat_result.st_mtime,
+                        stat_result.st_ino))
+        except OSError:
+            # Same as os.walk: skip folders that can't be listed. Without a
+            # directory record it isn't cached and gets listed again next time
+            return records, sub_dirs, None
+        return records, sub_dirs, DirectoryRecord(path, mtime, len(records) + len(sub_dirs))
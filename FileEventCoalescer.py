@@ -0,0 +1,107 @@
+import threading
+import time
+import traceback
+
+
+# Collects file events of the watcher and hands them on in batches, once no
+# new event came in for `delay` seconds or the oldest one waited for
+# `max_delay` seconds. Events of the same path are merged, only whether the
+# file has to be (re)indexed or removed is kept. A file that was created
+# and removed again within a batch is dropped altogether.
+class FileEventCoalescer():
+    # What is left of the events of a path, also used by IndexWriterService
+    change_action = "changed"
+    delete_action = "deleted"
+
+    def __init__(self, apply_changes, delay=0.5, max_delay=5.0):
+        # apply_changes(changed_paths, deleted_paths) is called on the
+        # coalescer's thread
+        self.apply_changes = apply_changes
+        self.delay = delay
+        self.max_delay = max_delay
+        # path -> [created in this batch, changed or deleted]
+        self.pending = {}
+        self.first_event_time = None
+        self.last_event_time = None
+        self.condition = threading.Condition()
+        self.is_stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        # Hands on what is still pending before the thread ends
+        with self.condition:
+            self.is_stopped = True
+            self.condition.notify()
+        self.thread.join()
+
+    def _add(self, path, action, created=False):
+        with self.condition:
+            now = time.monotonic()
+            if len(self.pending) == 0:
+                self.first_event_time = now
+            self.last_event_time = now
+            event = self.pending.get(path)
+            if event is None:
+                self.pending[path] = [created, action]
+            else:
+                event[1] = action
+            self.condition.notify()
+
+    def created(self, path):
+        self._add(path, self.change_action, created=True)
+
+    def modified(self, path):
+        self._add(path, self.change_action)
+
+    def deleted(self, path):
+        self._add(path, self.delete_action)
+
+    def moved(self, src_path, dest_path):
+        self._add(src_path, self.delete_action)
+        # Could replace an indexed file, so not counted as created
+        self._add(dest_path, self.change_action)
+
+    def _take_batch(self):
+        # Waits until a batch is due. Once stopped the pending events are
+        # due right away, then None.
+        with self.condition:
+            while True:
+                if self.is_stopped:
+                    if len(self.pending) == 0:
+                        return None
+                    batch = self.pending
+                    self.pending = {}
+                    return batch
+                if len(self.pending) == 0:
+                    self.condition.wait()
+                    continue
+                now = time.monotonic()
+                due = min(self.last_event_time + self.delay,
+                          self.first_event_time + self.max_delay)
+                if now < due:
+                    self.condition.wait(due - now)
+                    continue
+                batch = self.pending
+                self.pending = {}
+                return batch
+
+    def run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            changed_paths = []
+            deleted_paths = []
+            for path, (created, action) in batch.items():
+                if action == self.change_action:
+                    changed_paths.append(path)
+                elif not created:
+                    deleted_paths.append(path)
+            try:
+                self.apply_changes(changed_paths, deleted_paths)
+            except Exception:
+                # Keep watching, the next start reconciles the index
+                traceback.print_exc()
@@ -0,0 +1,266 @@
+import os
+import sqlite3
+import threading
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from DuplicateFinder import FileHashes
+from FileCrawler import DirectoryListing, DirectoryRecord, FileRecord
+
+
+class ManifestDiff(NamedTuple):
+    added: List[FileRecord]
+    removed: Set[str]
+    changed: List[FileRecord]
+
+
+# Snapshot of size, mtime and inode of every indexed file, stored next to
+# the Whoosh index. Comparing a crawl against it is a dict lookup per file
+# instead of deserialising every stored document of the index.
+class FileManifest():
+    file_name = "manifest.sqlite"
+
+    def __init__(self, path_to_manifest):
+        self.path_to_manifest = path_to_manifest
+        # Used from the index build worker and the watcher thread
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path_to_manifest, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime REAL, inode INTEGER"
+                ") WITHOUT ROWID")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS directories ("
+                "path TEXT PRIMARY KEY, mtime REAL, child_count INTEGER"
+                ") WITHOUT ROWID")
+            # Files indexed without their sniffed file type yet
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS pending_file_types ("
+                "path TEXT PRIMARY KEY) WITHOUT ROWID")
+            # Content hashes of the duplicate search, valid while size and
+            # mtime match the file
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime REAL, "
+                "partial_hash TEXT, full_hash TEXT) WITHOUT ROWID")
+            # Extractions of a file at its mtime that took too long
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS content_timeouts ("
+                "path TEXT PRIMARY KEY, mtime REAL, count INTEGER) WITHOUT ROWID")
+            # mtime of the files whose content is indexed
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS file_contents ("
+                "path TEXT PRIMARY KEY, mtime REAL) WITHOUT ROWID")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                "key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+
+    def get_meta(self, key) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_meta(self, key, value: str):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, value))
+
+    def is_complete(self) -> bool:
+        # False until a full crawl was written, e.g. for an index created
+        # before the manifest existed
+        return self.get_meta("complete") == "1"
+
+    def set_complete(self, complete: bool):
+        self.set_meta("complete", "1" if complete else "0")
+
+    def snapshot(self) -> Dict[str, Tuple[int, float, int]]:
+        with self.lock:
+            return {path: (size, mtime, inode) for path, size, mtime, inode in
+                    self.connection.execute(
+                        "SELECT path, size, mtime, inode FROM files")}
+
+    def listings(self, snapshot: Dict[str, Tuple[int, float, int]]) -> Dict[str, DirectoryListing]:
+        # Directory listings of the last crawl, rebuilt from the file snapshot
+        with self.lock:
+            listings = {path: DirectoryListing(DirectoryRecord(path, mtime, child_count), [], [])
+                        for path, mtime, child_count in self.connection.execute(
+                            "SELECT path, mtime, child_count FROM directories")}
+        for path, (size, mtime, inode) in snapshot.items():
+            listing = listings.get(os.path.dirname(path))
+            if listing is not None:
+                listing.files.append(FileRecord(path, size, mtime, inode))
+        for path in listings:
+            parent = os.path.dirname(path)
+            if parent != path and parent in listings:
+                listings[parent].sub_dirs.append(path)
+        return listings
+
+    def diff(self, records: Iterable[FileRecord], snapshot=None) -> ManifestDiff:
+        if snapshot is None:
+            snapshot = self.snapshot()
+        else:
+            snapshot = dict(snapshot)
+        added = []
+        changed = []
+        for record in records:
+            known = snapshot.pop(record.path, None)
+            if known is None:
+                added.append(record)
+            elif known[:2] != (record.size, record.mtime) or \
+                    known[2] != record.inode and known[2] != 0 and record.inode != 0:
+                # The crawler's inode is 0 on Windows while os.stat has the
+                # real one, an inode is only compared when both sides know it
+                changed.append(record)
+        # Whatever wasn't crawled anymore has been removed
+        return ManifestDiff(added, set(snapshot), changed)
+
+    def _select_paths(self, query, paths: Iterable[str]):
+        # Rows of query, whose "IN (%s)" is filled with the paths. In chunks
+        # to stay below SQLite's limit of host parameters. The caller holds
+        # the lock.
+        paths = list(paths)
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            yield from self.connection.execute(query % ",".join("?" * len(chunk)), chunk)
+
+    def known_paths(self, paths: Iterable[str]) -> Set[str]:
+        # The given paths that are in the manifest
+        with self.lock:
+            return {path for path, in self._select_paths(
+                "SELECT path FROM files WHERE path IN (%s)", paths)}
+
+    def update(self, records: Iterable[FileRecord]):
+        # The documents of the records were written without content
+        records = list(records)
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime, inode) "
+                "VALUES (?, ?, ?, ?)",
+                ((record.path, record.size, record.mtime, record.inode)
+                 for record in records))
+            self.connection.executemany(
+                "DELETE FROM file_contents WHERE path = ?",
+                ((record.path,) for record in records))
+
+    def remove(self, paths: Iterable[str]):
+        paths = list(paths)
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM files WHERE path = ?",
+                ((path,) for path in paths))
+            self.connection.executemany(
+                "DELETE FROM pending_file_types WHERE path = ?",
+                ((path,) for path in paths))
+            self.connection.executemany(
+                "DELETE FROM file_hashes WHERE path = ?",
+                ((path,) for path in paths))
+            self.connection.executemany(
+                "DELETE FROM file_contents WHERE path = ?",
+                ((path,) for path in paths))
+            self.connection.executemany(
+                "DELETE FROM content_timeouts WHERE path = ?",
+                ((path,) for path in paths))
+
+    def add_pending_file_types(self, paths: Iterable[str]):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO pending_file_types (path) VALUES (?)",
+                ((path,) for path in paths))
+
+    def pending_file_types(self, limit: int) -> List[str]:
+        with self.lock:
+            return [path for path, in self.connection.execute(
+                "SELECT path FROM pending_file_types LIMIT ?", (limit,))]
+
+    def remove_pending_file_types(self, paths: Iterable[str]):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM pending_file_types WHERE path = ?",
+                ((path,) for path in paths))
+
+    def content_candidates(self) -> List[Tuple[str, float]]:
+        # (path, mtime) of the files whose content isn't indexed at their
+        # current mtime
+        with self.lock:
+            return self.connection.execute(
+                "SELECT files.path, files.mtime FROM files "
+                "LEFT JOIN file_contents ON file_contents.path = files.path "
+                "WHERE file_contents.mtime IS NULL "
+                "OR file_contents.mtime != files.mtime").fetchall()
+
+    def set_file_contents(self, content_mtimes: Iterable[Tuple[str, float]]):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO file_contents (path, mtime) VALUES (?, ?)",
+                content_mtimes)
+
+    def count_content_timeouts(self, content_mtimes: Iterable[Tuple[str, float]]) -> Dict[str, int]:
+        # Counts another timeout of the files at their mtime, a file that
+        # changed starts over. Returns the counts.
+        content_mtimes = list(content_mtimes)
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO content_timeouts (path, mtime, count) VALUES (?, ?, 1) "
+                "ON CONFLICT (path) DO UPDATE SET "
+                "count = CASE WHEN mtime = excluded.mtime THEN count + 1 ELSE 1 END, "
+                "mtime = excluded.mtime",
+                content_mtimes)
+            return dict(self._select_paths(
+                "SELECT path, count FROM content_timeouts WHERE path IN (%s)",
+                (path for path, mtime in content_mtimes)))
+
+    def file_hashes(self, paths: Iterable[str]) -> Dict[str, FileHashes]:
+        with self.lock:
+            return {row[0]: FileHashes(*row) for row in self._select_paths(
+                "SELECT path, size, mtime, partial_hash, full_hash FROM file_hashes "
+                "WHERE path IN (%s)", paths)}
+
+    def update_file_hashes(self, file_hashes: Iterable[FileHashes]):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO file_hashes "
+                "(path, size, mtime, partial_hash, full_hash) VALUES (?, ?, ?, ?, ?)",
+                file_hashes)
+
+    def move_file_hashes(self, moves: Iterable[Tuple[str, str]]):
+        # Moves keep size and mtime, so the hashes stay valid
+        moves = list(moves)
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM file_hashes WHERE path = ?",
+                ((dest_path,) for source_path, dest_path in moves))
+            self.connection.executemany(
+                "UPDATE file_hashes SET path = ? WHERE path = ?",
+                ((dest_path, source_path) for source_path, dest_path in moves))
+
+    def replace_directories(self, directories: Iterable[DirectoryRecord]):
+        # Only written after a complete crawl, the files of these directories
+        # have to be in the manifest already
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM directories")
+            self.connection.executemany(
+                "INSERT INTO directories (path, mtime, child_count) VALUES (?, ?, ?)",
+                directories)
+
+    def table_counts(self) -> Dict[str, int]:
+        # Rows per table, for the stats of the command line
+        with self.lock:
+            return {table: self.connection.execute(
+                        f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("files", "directories", "pending_file_types",
+                                  "file_hashes", "file_contents", "content_timeouts")}
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("DELETE FROM directories")
+            self.connection.execute("DELETE FROM pending_file_types")
+            self.connection.execute("DELETE FROM file_hashes")
+            self.connection.execute("DELETE FROM file_contents")
+            self.connection.execute("DELETE FROM content_timeouts")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('complete', '0')")
@@ -0,0 +1,257 @@
+import errno
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+import traceback
+
+from typing import List, NamedTuple, Tuple
+
+from FileCollection import FileRowDelta
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+
+class FileMoveResult(NamedTuple):
+    # (source, destination) of the moved files
+    moved: List[Tuple[str, str]]
+    # (source, destination, error) of the files that couldn't be moved
+    failed: List[Tuple[str, str, OSError]]
+    # The moves as row deltas for the GUI
+    deltas: List[FileRowDelta]
+    # Moves not done because the batch was cancelled, starting with the one
+    # that was interrupted
+    remaining: List[Tuple[str, str]]
+
+
+# Moves a batch of files, e.g. the files sorted into a category, and
+# updates the index for all of them in one writer commit. The watcher
+# events of these moves are suppressed, see is_suppressed, they are in the
+# index already.
+class FileMover():
+    # Seconds the watcher events of the moved files are still suppressed
+    # after a batch, watchdog delivers them with some delay
+    suppress_seconds: float = 10.0
+    # Copies across drives are streamed in chunks of this size
+    copy_buffer_size: int = 8 * 1024 * 1024
+    # Copied to this file next to the destination first, a cancelled copy
+    # is resumed from it
+    partial_suffix: str = ".part"
+    # ioctl of Linux that makes the destination share the extents of the
+    # source (reflink), on Btrfs, XFS and the like
+    ficlone_request = 0x40049409
+    # Errors of a kernel copy that doesn't work for the two files, the next
+    # way of copying is tried then
+    unsupported_copy_errnos = {errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                               errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+
+    def __init__(self, file_collection, index_changes=None):
+        self.file_collection = file_collection
+        # index_changes(changed_paths, deleted_paths) writes changes to the
+        # index later, e.g. IndexWriterService.submit. Moves whose index
+        # update failed are handed to it.
+        self.index_changes = index_changes
+        # path -> monotonic time until which its events are suppressed
+        self.suppressed_paths = {}
+        # Partial copy path -> (source path, size, mtime) of the copy it
+        # holds. Only these are resumed, other files with the suffix, e.g.
+        # of an earlier session, are overwritten.
+        self.partial_copies = {}
+        # Batches run on a worker thread, the watcher asks on its own
+        self.lock = threading.Lock()
+
+    def suppress(self, paths, until):
+        with self.lock:
+            for path in paths:
+                self.suppressed_paths[path] = until
+
+    def is_suppressed(self, path) -> bool:
+        with self.lock:
+            until = self.suppressed_paths.get(path)
+            if until is None:
+                return False
+            if time.monotonic() < until:
+                return True
+            del self.suppressed_paths[path]
+            return False
+
+    def move_file(self, source_path, dest_path, on_progress=None, is_cancelled=None) -> bool:
+        # A rename within the file system. Like shutil.move an existing
+        # file at the destination is replaced. on_progress(bytes) is called
+        # as the file is moved, False is returned if it was cancelled.
+        try:
+            os.replace(source_path, dest_path)
+        except OSError as error:
+            if error.errno != errno.EXDEV:
+                raise
+            # Another drive, copy and remove the source
+            if not self.copy_file(source_path, dest_path, on_progress, is_cancelled):
+                return False
+            os.remove(source_path)
+            return True
+        if on_progress is not None:
+            on_progress(os.stat(dest_path).st_size)
+        return True
+
+    def copy_file(self, source_path, dest_path, on_progress=None, is_cancelled=None) -> bool:
+        # Copies in chunks, so a cancel takes effect within one chunk. The
+        # partial copy of a cancelled run is continued. Like a rename the
+        # copy keeps the mtime, the indexed last_modified stays valid.
+        partial_path = dest_path + self.partial_suffix
+        source_stat = os.stat(source_path)
+        source_size = source_stat.st_size
+        partial_copy = (source_path, source_size, source_stat.st_mtime)
+        copied = 0
+        with self.lock:
+            if self.partial_copies.get(partial_path) == partial_copy:
+                try:
+                    copied = os.stat(partial_path).st_size
+                except OSError:
+                    pass
+            self.partial_copies[partial_path] = partial_copy
+        if copied > source_size:
+            copied = 0
+        if on_progress is not None and copied > 0:
+            on_progress(copied)
+        # Unbuffered, the chunks are copied by the kernel where it can
+        with open(source_path, "rb", buffering=0) as source, \
+                open(partial_path, "r+b" if copied > 0 else "wb", buffering=0) as dest:
+            if copied > 0:
+                # Not truncated otherwise, on ext4 a truncate to 0 makes
+                # closing the file flush it to disk
+                dest.truncate(copied)
+            if copied == 0 and self.clone_file(source, dest):
+                if on_progress is not None:
+                    on_progress(source_size)
+            elif not self.copy_chunks(source, dest, copied, on_progress, is_cancelled):
+                return False
+        shutil.copystat(source_path, partial_path)
+        os.replace(partial_path, dest_path)
+        with self.lock:
+            self.partial_copies.pop(partial_path, None)
+        return True
+
+    def discard_partial_copies(self, moves):
+        # Removes the partial copies of moves that won't be resumed
+        for source_path, dest_path in moves:
+            partial_path = dest_path + self.partial_suffix
+            with self.lock:
+                if self.partial_copies.pop(partial_path, None) is None:
+                    continue
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+
+    def clone_file(self, source, dest) -> bool:
+        if fcntl is None or not sys.platform.startswith("linux"):
+            return False
+        try:
+            fcntl.ioctl(dest.fileno(), self.ficlone_request, source.fileno())
+            return True
+        except OSError:
+            # Other file systems, or source and destination on two of them
+            return False
+
+    def copy_file_range_chunk(self, source, dest, offset):
+        # Within the kernel, also server side on network file systems
+        return os.copy_file_range(
+            source.fileno(), dest.fileno(), self.copy_buffer_size, offset, offset)
+
+    def sendfile_chunk(self, source, dest, offset):
+        # Within the kernel, between file systems copy_file_range refuses
+        dest.seek(offset)
+        return os.sendfile(dest.fileno(), source.fileno(), offset, self.copy_buffer_size)
+
+    def read_write_chunk(self, source, dest, offset, buffer):
+        source.seek(offset)
+        count = source.readinto(buffer)
+        if count == 0:
+            return 0
+        dest.seek(offset)
+        with memoryview(buffer) as view:
+            dest.write(view[:count])
+        return count
+
+    def copy_chunks(self, source, dest, offset, on_progress=None, is_cancelled=None) -> bool:
+        # The copy functions in the order they are tried, one that fails
+        # with an unsupported error is dropped for the rest of the file
+        copy_chunk_functions = []
+        if hasattr(os, "copy_file_range"):
+            copy_chunk_functions.append(self.copy_file_range_chunk)
+        if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+            copy_chunk_functions.append(self.sendfile_chunk)
+        buffer = bytearray(self.copy_buffer_size)
+        copy_chunk_functions.append(
+            lambda source, dest, offset: self.read_write_chunk(source, dest, offset, buffer))
+        while True:
+            if is_cancelled is not None and is_cancelled():
+                return False
+            try:
+                count = copy_chunk_functions[0](source, dest, offset)
+            except OSError as error:
+                if len(copy_chunk_functions) == 1 or \
+                        error.errno not in self.unsupported_copy_errnos:
+                    raise
+                del copy_chunk_functions[0]
+                continue
+            if count == 0:
+                return True
+            offset += count
+            if on_progress is not None:
+                on_progress(count)
+
+    def move_files(self, moves, on_progress=None, is_cancelled=None) -> FileMoveResult:
+        # moves are (source, destination) pairs of files, missing
+        # destination folders are created. on_progress(bytes, files) is
+        # called with the bytes and files moved since the last call.
+        moves = list(moves)
+        paths = [path for source_path, dest_path in moves
+                 for path in (source_path, dest_path, dest_path + self.partial_suffix)]
+        # The watcher may see the first rename before the batch is done
+        self.suppress(paths, math.inf)
+        moved = []
+        failed = []
+        remaining = []
+        bytes_progress = None
+        if on_progress is not None:
+            bytes_progress = lambda count: on_progress(count, 0)
+        try:
+            for i, (source_path, dest_path) in enumerate(moves):
+                if is_cancelled is not None and is_cancelled():
+                    remaining = moves[i:]
+                    break
+                try:
+                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                    if not self.move_file(source_path, dest_path, bytes_progress, is_cancelled):
+                        remaining = moves[i:]
+                        break
+                    moved.append((source_path, dest_path))
+                except OSError as error:
+                    failed.append((source_path, dest_path, error))
+                if on_progress is not None:
+                    on_progress(0, 1)
+        except BaseException:
+            self.suppress(paths, time.monotonic() + self.suppress_seconds)
+            raise
+        try:
+            deltas = self.file_collection.apply_file_moves(moved)
+        except Exception:
+            # E.g. a LockError while another writer holds the index. The
+            # files are moved already, so their watcher events aren't
+            # suppressed and the changes are indexed later instead.
+            traceback.print_exc()
+            self.suppress(paths, 0)
+            if self.index_changes is not None:
+                self.index_changes([dest_path for source_path, dest_path in moved],
+                                   [source_path for source_path, dest_path in moved])
+            deltas = []
+        else:
+            self.suppress(paths, time.monotonic() + self.suppress_seconds)
+        return FileMoveResult(moved, failed, deltas, remaining)
@@ -0,0 +1,270 @@
+from PySide6.QtCore import QAbstractTableModel, QCoreApplication, QModelIndex, Qt
+from PySide6.QtGui import QBrush, QColor
+
+from FileCollection import FileRowDelta, FileSearchResults
+
+
+# Table model over paged search results. Loaded rows are kept column by
+# column and only formatted when the view asks for them, further pages
+# are fetched when the view scrolls to the end of the loaded rows.
+class FileTableModel(QAbstractTableModel):
+    page_size = 200
+    # Sort keys of the table columns
+    sort_keys = ["file_name", "file_size", "file_type", "last_modified"]
+    header_texts = [u"Dateiname", u"Dateigröße",
+                    u"Dateityp", u"Zuletzt geändert"]
+    # Background of the rows of files that have duplicates
+    duplicate_brush = QBrush(QColor(255, 228, 196))
+
+    def __init__(self, parent=None, search_runner=None):
+        super().__init__(parent)
+        # search_runner(model, search) runs search() off the GUI thread and
+        # passes its result on to show_search_results. Without one searches
+        # run right away.
+        self.search_runner = search_runner
+        self.search_function = None
+        # Counts the started searches, only the latest one gets shown
+        self.search_generation = 0
+        self.results: FileSearchResults = None
+        self.sort_column = 0
+        self.sort_order = Qt.SortOrder.AscendingOrder
+        # Path -> paths of the other files with the same content
+        self.duplicates = {}
+        self.clear_columns()
+
+    def clear_columns(self):
+        self.file_names = []
+        self.paths = []
+        self.file_sizes = []
+        self.file_types = []
+        self.last_modified = []
+        # Hits taken from the results, rows inserted or removed by deltas
+        # don't shift the fetched pages
+        self.fetched = 0
+        # Changes applied by deltas, hits of the results that are outdated
+        # by them are skipped when fetched
+        self.inserted_paths = set()
+        self.removed_paths = set()
+
+    def set_search(self, search_function, results: FileSearchResults = None):
+        # search_function(sort_key, reverse) returns the FileSearchResults
+        # to show, it is called again when the view changes the sorting.
+        # Results that are already at hand, e.g. refined ones, are shown
+        # right away instead of searching.
+        self.search_function = search_function
+        if results is None:
+            self.refresh()
+            return
+        # A search that is still running is stale now
+        self.search_generation += 1
+        self.set_results(results)
+
+    def refresh(self):
+        if self.search_function is None:
+            return
+        self.search_generation += 1
+        generation = self.search_generation
+        search_function = self.search_function
+        sort_key, reverse = self.current_sort()
+
+        def search():
+            return generation, search_function(sort_key, reverse)
+
+        if self.search_runner is None:
+            self.show_search_results(search())
+        else:
+            self.search_runner(self, search)
+
+    def show_search_results(self, generation_and_results):
+        generation, results = generation_and_results
+        if generation != self.search_generation:
+            # Overtaken by a newer search
+            results.close()
+            return
+        self.set_results(results)
+
+    def current_sort(self):
+        return (self.sort_keys[self.sort_column],
+                self.sort_order == Qt.SortOrder.DescendingOrder)
+
+    def set_results(self, results: FileSearchResults):
+        self.beginResetModel()
+        if self.results is not None:
+            self.results.close()
+        self.results = results
+        self.clear_columns()
+        self.endResetModel()
+        if self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.paths)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.sort_keys)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return self.file_names[row]
+            elif column == 1:
+                return str(self.file_sizes[row]) + " KB"
+            elif column == 2:
+                return self.file_types[row]
+            else:
+                return self.last_modified[row].isoformat(sep=" ", timespec="seconds")
+        elif role == Qt.ItemDataRole.UserRole:
+            return self.paths[row]
+        elif role == Qt.ItemDataRole.TextAlignmentRole and column == 1:
+            return Qt.AlignTrailing | Qt.AlignVCenter
+        elif role == Qt.ItemDataRole.BackgroundRole and self.paths[row] in self.duplicates:
+            return self.duplicate_brush
+        elif role == Qt.ItemDataRole.ToolTipRole and self.paths[row] in self.duplicates:
+            return QCoreApplication.translate("MainWindow", u"Duplikat von:", None) + \
+                "\n" + "\n".join(self.duplicates[self.paths[row]])
+        return None
+
+    def set_duplicates(self, duplicates):
+        # duplicates are the groups of paths of FileCollection.find_duplicates
+        self.duplicates = {}
+        for group in duplicates:
+            for path in group:
+                self.duplicates[path] = [other_path for other_path in group
+                                         if other_path != path]
+        if len(self.paths) > 0:
+            self.dataChanged.emit(
+                self.index(0, 0), self.index(len(self.paths) - 1, self.columnCount() - 1),
+                [Qt.ItemDataRole.BackgroundRole, Qt.ItemDataRole.ToolTipRole])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation != Qt.Orientation.Horizontal:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return QCoreApplication.translate("MainWindow", self.header_texts[section], None)
+        elif role == Qt.ItemDataRole.TextAlignmentRole:
+            if section == 1:
+                return Qt.AlignTrailing | Qt.AlignVCenter
+            return Qt.AlignLeading | Qt.AlignVCenter
+        return None
+
+    def canFetchMore(self, parent):
+        if parent.isValid() or self.results is None:
+            return False
+        return self.fetched < self.results.total
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self.results is None:
+            return
+        hits = self.results.fetch(self.fetched, self.page_size)
+        self.fetched += len(hits)
+        hits = [hit for hit in hits
+                if hit["path_with_file_name"] not in self.removed_paths and
+                hit["path_with_file_name"] not in self.inserted_paths]
+        if len(hits) == 0:
+            return
+        first_row = len(self.paths)
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(hits) - 1)
+        for hit in hits:
+            self.file_names.append(hit["file_name"])
+            self.paths.append(hit["path_with_file_name"])
+            self.file_sizes.append(hit["file_size"])
+            self.file_types.append(hit["file_type"])
+            self.last_modified.append(hit["last_modified"])
+        self.endInsertRows()
+
+    def refinable_results(self):
+        # The results, unless deltas changed the rows since they were shown
+        if len(self.inserted_paths) > 0 or len(self.removed_paths) > 0:
+            return None
+        return self.results
+
+    def _sort_column_values(self):
+        return [self.file_names, self.file_sizes, self.file_types,
+                self.last_modified][self.sort_column]
+
+    def _insert_position(self, sort_value):
+        # Binary search in the loaded rows, which are in the table's order
+        values = self._sort_column_values()
+        is_descending = self.sort_order == Qt.SortOrder.DescendingOrder
+        low = 0
+        high = len(values)
+        while low < high:
+            middle = (low + high) // 2
+            if (values[middle] > sort_value) if is_descending else (values[middle] <= sort_value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _set_row(self, row, hit):
+        self.file_names[row] = hit["file_name"]
+        self.file_sizes[row] = hit["file_size"]
+        self.file_types[row] = hit["file_type"]
+        self.last_modified[row] = hit["last_modified"]
+
+    def apply_deltas(self, deltas):
+        # Applies the FileRowDeltas of the file watcher to the loaded rows.
+        # Rows are inserted, updated and removed one by one, so the view
+        # keeps its scroll position and selection.
+        if self.results is None:
+            return
+        sort_key = self.sort_keys[self.sort_column]
+        sort_values = self._sort_column_values()
+        row_of_path = {path: row for row, path in enumerate(self.paths)}
+        rows_to_remove = []
+        hits_to_insert = []
+        for delta in deltas:
+            path = delta.path_with_file_name
+            row = row_of_path.get(path)
+            if delta.kind == FileRowDelta.remove or \
+                    not self.results.matches(path, row is not None):
+                # Also a file whose new name doesn't match the search anymore
+                self.removed_paths.add(path)
+                self.inserted_paths.discard(path)
+                if row is not None:
+                    rows_to_remove.append(row)
+            elif row is not None and sort_values[row] == delta.row[sort_key]:
+                self._set_row(row, delta.row)
+                self.dataChanged.emit(self.index(row, 0),
+                                      self.index(row, self.columnCount() - 1))
+            else:
+                # New, or moves to another position
+                if row is not None:
+                    rows_to_remove.append(row)
+                self.inserted_paths.add(path)
+                self.removed_paths.discard(path)
+                hits_to_insert.append(delta.row)
+
+        for row in sorted(rows_to_remove, reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.file_names[row]
+            del self.paths[row]
+            del self.file_sizes[row]
+            del self.file_types[row]
+            del self.last_modified[row]
+            self.endRemoveRows()
+        for hit in hits_to_insert:
+            # A row sorted past the loaded rows ends up right after them
+            row = self._insert_position(hit[sort_key])
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.file_names.insert(row, hit["file_name"])
+            self.paths.insert(row, hit["path_with_file_name"])
+            self.file_sizes.insert(row, hit["file_size"])
+            self.file_types.insert(row, hit["file_type"])
+            self.last_modified.insert(row, hit["last_modified"])
+            self.endInsertRows()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        # Sorted by the index, so the whole result is in order and not just
+        # the loaded rows
+        self.sort_column = column
+        self.sort_order = order
+        self.refresh()
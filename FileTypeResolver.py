@@ -0,0 +1,144 @@
+import json
+import mimetypes
+import os
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import magic
+except ImportError:
+    # Without libmagic files of unknown extensions get unknown_file_type
+    magic = None
+
+try:
+    from winreg import HKEYType, ConnectRegistry, HKEY_LOCAL_MACHINE, OpenKey, QueryValueEx
+except ImportError:
+    # Not on Windows, types only come from the mimetypes table
+    ConnectRegistry = None
+
+
+# Windows application names from extension
+class ExtensionQuery:
+    def __init__(self):
+        self.base: str = r"SOFTWARE\Classes"
+        self.reg: HKEYType = ConnectRegistry(None, HKEY_LOCAL_MACHINE)
+
+    def _get_value_from_class(self, class_str: str) -> str:
+        path: str = fr"{self.base}\{class_str}"
+        key: HKEYType = OpenKey(self.reg, path)
+        value_tuple: Tuple[str, int] = QueryValueEx(key, "")
+        return value_tuple[0]
+
+    def get_application_name(self, ext: str) -> str:
+        return self._get_value_from_class(self._get_value_from_class(ext))
+
+
+def mime_type_from_extension(ext: str) -> Optional[str]:
+    return mimetypes.guess_type("file" + ext, strict=False)[0]
+
+
+# File type names are looked up once per extension, by default from the
+# Windows registry and then the mimetypes table. Only files without
+# extension or with an unknown one are sniffed by their content.
+class FileTypeResolver():
+    file_name = "file_types.json"
+    unknown_file_type = "application/octet-stream"
+
+    def __init__(self, path_to_table=None, extension_resolvers: List[Callable[[str], Optional[str]]] = None,
+                 cache_size=4096, max_workers=8):
+        if extension_resolvers is None:
+            extension_resolvers = [mime_type_from_extension]
+            if ConnectRegistry is not None:
+                extension_resolvers.insert(0, ExtensionQuery().get_application_name)
+        self.path_to_table = path_to_table
+        self.extension_resolvers = extension_resolvers
+        self.cache_size = cache_size
+        self.max_workers = max_workers
+        # LRU of extension -> type name, None for extensions no resolver knows
+        self.extension_types = OrderedDict()
+        self.lock = threading.Lock()
+        # libmagic handles can't be shared between threads
+        self.thread_local = threading.local()
+        self.load()
+
+    def load(self):
+        if self.path_to_table is None or not os.path.exists(self.path_to_table):
+            return
+        try:
+            with open(self.path_to_table, encoding="utf-8") as table_file:
+                self.extension_types.update(json.load(table_file))
+        except (OSError, ValueError):
+            # Broken table, it is rebuilt while indexing
+            self.extension_types.clear()
+
+    def save(self):
+        if self.path_to_table is None:
+            return
+        with self.lock:
+            table = dict(self.extension_types)
+        with open(self.path_to_table, "w", encoding="utf-8") as table_file:
+            json.dump(table, table_file)
+
+    def type_from_extension(self, ext: str) -> Optional[str]:
+        ext = ext.lower()
+        if ext == "":
+            return None
+        with self.lock:
+            if ext in self.extension_types:
+                self.extension_types.move_to_end(ext)
+                return self.extension_types[ext]
+
+        file_type_name = None
+        for extension_resolver in self.extension_resolvers:
+            try:
+                file_type_name = extension_resolver(ext)
+            except Exception:
+                file_type_name = None
+            if file_type_name:
+                break
+            file_type_name = None
+
+        with self.lock:
+            self.extension_types[ext] = file_type_name
+            if len(self.extension_types) > self.cache_size:
+                self.extension_types.popitem(last=False)
+        return file_type_name
+
+    def sniff(self, path) -> str:
+        if magic is None:
+            return self.unknown_file_type
+        mime_type_determiner = getattr(self.thread_local, "mime_type_determiner", None)
+        if mime_type_determiner is None:
+            mime_type_determiner = magic.Magic(mime=True)
+            self.thread_local.mime_type_determiner = mime_type_determiner
+        try:
+            return mime_type_determiner.from_file(path)
+        except Exception:
+            # File vanished or can't be read
+            return self.unknown_file_type
+
+    def resolve(self, path) -> str:
+        file_type_name = self.type_from_extension(os.path.splitext(path)[1])
+        if file_type_name is None:
+            file_type_name = self.sniff(path)
+        return file_type_name
+
+    def resolve_many(self, paths, sniff=True) -> List[Optional[str]]:
+        # With sniff=False files that would need content sniffing get None
+        file_type_names = [self.type_from_extension(os.path.splitext(path)[1])
+                           for path in paths]
+        if not sniff:
+            return file_type_names
+        to_sniff = [i for i, file_type_name in enumerate(file_type_names)
+                    if file_type_name is None]
+        if len(to_sniff) == 1:
+            file_type_names[to_sniff[0]] = self.sniff(paths[to_sniff[0]])
+        elif len(to_sniff) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                sniffed = executor.map(self.sniff, (paths[i] for i in to_sniff))
+                for i, file_type_name in zip(to_sniff, sniffed):
+                    file_type_names[i] = file_type_name
+        return file_type_names
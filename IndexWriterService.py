@@ -0,0 +1,115 @@
+import queue
+import threading
+import time
+import traceback
+
+from FileEventCoalescer import FileEventCoalescer
+from whoosh.index import LockError
+
+
+# The one thread that writes the file watcher's changes to the index.
+# Changes are queued by any thread and buffered per path, the last change
+# of a path wins. The buffer is written and committed in one go once it
+# holds commit_every_documents paths or its oldest change is
+# commit_interval seconds old. If another writer (index build, file type
+# enrichment) holds the index lock, the buffer is kept and the commit is
+# tried again later, like Whoosh's AsyncWriter.
+class IndexWriterService():
+    # Commits tried by stop() while the index is locked, each waits for
+    # the writer timeout of the file collection
+    stop_commit_attempts: int = 3
+
+    def __init__(self, file_collection, on_commit=None,
+                 commit_every_documents=1000, commit_interval=1.0):
+        self.file_collection = file_collection
+        # on_commit(deltas) is called on the service thread after every
+        # commit with the FileRowDeltas of the committed changes
+        self.on_commit = on_commit
+        self.commit_every_documents = commit_every_documents
+        self.commit_interval = commit_interval
+        self.queue = queue.Queue()
+        # path -> changed or deleted, not written yet
+        self.pending = {}
+        self.first_pending_time = None
+        # No commit is tried before this time after the index was locked
+        self.retry_time = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        # Commits what is still buffered
+        self.queue.put(None)
+        self.thread.join()
+
+    def submit(self, changed_paths, deleted_paths):
+        self.queue.put((list(changed_paths), list(deleted_paths)))
+
+    def _buffer(self, changed_paths, deleted_paths):
+        if len(self.pending) == 0:
+            self.first_pending_time = time.monotonic()
+        for path in deleted_paths:
+            self.pending[path] = FileEventCoalescer.delete_action
+        for path in changed_paths:
+            self.pending[path] = FileEventCoalescer.change_action
+
+    def _commit(self):
+        changed_paths = [path for path, action in self.pending.items()
+                         if action == FileEventCoalescer.change_action]
+        deleted_paths = [path for path, action in self.pending.items()
+                         if action == FileEventCoalescer.delete_action]
+        try:
+            deltas = self.file_collection.apply_file_changes(changed_paths, deleted_paths)
+        except LockError:
+            # Index is locked by another writer, try again next interval
+            self.retry_time = time.monotonic() + self.commit_interval
+            return
+        self.pending = {}
+        if self.on_commit is not None:
+            self.on_commit(deltas)
+
+    def _commit_time(self, now):
+        if len(self.pending) >= self.commit_every_documents:
+            commit_time = now
+        else:
+            commit_time = self.first_pending_time + self.commit_interval
+        return max(commit_time, self.retry_time)
+
+    def run(self):
+        while True:
+            timeout = None
+            if len(self.pending) > 0:
+                now = time.monotonic()
+                timeout = max(0, self._commit_time(now) - now)
+            items = []
+            try:
+                items.append(self.queue.get(timeout=timeout))
+                # Take everything queued meanwhile, so an event storm is
+                # buffered at once instead of item by item
+                while True:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            is_stopping = None in items
+            try:
+                for item in items:
+                    if item is not None:
+                        self._buffer(*item)
+                if is_stopping:
+                    # Another writer may still hold the lock for a while
+                    for _ in range(self.stop_commit_attempts):
+                        if len(self.pending) == 0:
+                            break
+                        self._commit()
+                    return
+                now = time.monotonic()
+                if len(self.pending) > 0 and now >= self._commit_time(now):
+                    self._commit()
+            except Exception:
+                # A buffer that can't be written is dropped, it would fail
+                # again
+                traceback.print_exc()
+                self.pending = {}
+                if is_stopping:
+                    return
@@ -0,0 +1,86 @@
+import os
+import threading
+
+from collections import OrderedDict
+from typing import Iterable, List, NamedTuple, Optional
+
+
+class CachedSearch(NamedTuple):
+    rows: List[dict]
+    size_in_bytes: int
+
+
+# LRU of materialised search hits keyed by (search_path, filename_search_value,
+# is_exact_path_search), rows are kept in index order. Changed files only
+# drop the entries whose folder scope and file name value cover them.
+class SearchResultCache():
+    def __init__(self, max_megabytes=16):
+        self.max_bytes = max_megabytes * 1024 * 1024
+        self.size_in_bytes = 0
+        self.searches = OrderedDict()
+        # Searches run on worker threads, invalidation on the watcher thread
+        self.lock = threading.Lock()
+        # Increased by every invalidation, rows of a search that started
+        # before one may already be outdated and aren't cached
+        self.generation = 0
+
+    @staticmethod
+    def _estimate_row_bytes(row: dict):
+        # The dict and its values, the path makes up most of the strings
+        return 512 + 3 * len(row["path_with_file_name"])
+
+    def get(self, key) -> Optional[List[dict]]:
+        with self.lock:
+            cached = self.searches.get(key)
+            if cached is None:
+                return None
+            self.searches.move_to_end(key)
+            return cached.rows
+
+    def put(self, key, rows: List[dict], generation):
+        size_in_bytes = sum(self._estimate_row_bytes(row) for row in rows)
+        if size_in_bytes > self.max_bytes:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            previous = self.searches.pop(key, None)
+            if previous is not None:
+                self.size_in_bytes -= previous.size_in_bytes
+            self.searches[key] = CachedSearch(rows, size_in_bytes)
+            self.size_in_bytes += size_in_bytes
+            while self.size_in_bytes > self.max_bytes:
+                _, evicted = self.searches.popitem(last=False)
+                self.size_in_bytes -= evicted.size_in_bytes
+
+    @staticmethod
+    def covers(key, parent_path, file_name):
+        # Whether a file with this folder and lower case name can be a hit
+        # of the search key
+        search_path, filename_search_value, is_exact_path_search = key
+        if is_exact_path_search:
+            if parent_path != search_path:
+                return False
+        elif parent_path != search_path and \
+                not parent_path.startswith(search_path + os.path.sep):
+            return False
+        # Whoosh matches file names case insensitive, a name that doesn't
+        # contain the value can't be a hit
+        return filename_search_value.lower() in file_name
+
+    def invalidate(self, paths: Iterable[str]):
+        # paths are files that were added, changed or removed
+        scopes = [(os.path.dirname(path), os.path.basename(path).lower())
+                  for path in paths]
+        with self.lock:
+            self.generation += 1
+            for key in [key for key in self.searches
+                        if any(self.covers(key, parent_path, file_name)
+                               for parent_path, file_name in scopes)]:
+                self.size_in_bytes -= self.searches.pop(key).size_in_bytes
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.searches.clear()
+            self.size_in_bytes = 0
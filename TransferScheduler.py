@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+from collections import deque
+from typing import List, NamedTuple
+
+from FileMover import FileMover, FileMoveResult
+
+
+class TransferProgress(NamedTuple):
+    files_done: int
+    # Files of the started and the queued batches
+    files_total: int
+    bytes_done: int
+    # Bytes of the started batches, queued ones are added once they start
+    bytes_total: int
+    bytes_per_second: float
+    files_per_second: float
+
+
+# Queue of file move batches, e.g. sort operations, that are run one after
+# the other by run() on a worker thread. A cancelled run keeps the moves it
+# didn't get to, the next run resumes them, a partly copied file included.
+class TransferScheduler():
+    # Seconds between progress reports, so the GUI isn't flooded by them
+    progress_interval: float = 0.1
+
+    def __init__(self, file_mover: FileMover):
+        self.file_mover = file_mover
+        # Lists of (source, destination) moves
+        self.batches = deque()
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+
+    def enqueue(self, moves):
+        with self.lock:
+            self.batches.append(list(moves))
+
+    def pending_files(self) -> int:
+        with self.lock:
+            return sum(len(batch) for batch in self.batches)
+
+    def cancel(self):
+        # Stops the running batch after the current chunk
+        self.cancel_event.set()
+
+    def discard(self):
+        # Drops the queued moves, e.g. when the app is closed, along with
+        # the partial copies of cancelled ones
+        with self.lock:
+            batches = list(self.batches)
+            self.batches.clear()
+        for moves in batches:
+            self.file_mover.discard_partial_copies(moves)
+
+    def run(self, progress_callback=None) -> List[FileMoveResult]:
+        # Moves the queued batches until none is left or it was cancelled.
+        # progress_callback is a signal that gets a TransferProgress.
+        self.cancel_event.clear()
+        start_time = time.monotonic()
+        # files_left are the not yet moved files of the running batch
+        progress = {"files_done": 0, "files_left": 0, "bytes_done": 0,
+                    "bytes_total": 0, "report_time": start_time}
+
+        def report(force=False):
+            now = time.monotonic()
+            if progress_callback is None or \
+                    not force and now < progress["report_time"] + self.progress_interval:
+                return
+            progress["report_time"] = now
+            elapsed = max(now - start_time, 1e-6)
+            progress_callback.emit(TransferProgress(
+                progress["files_done"],
+                progress["files_done"] + progress["files_left"] + self.pending_files(),
+                progress["bytes_done"], progress["bytes_total"],
+                progress["bytes_done"] / elapsed, progress["files_done"] / elapsed))
+
+        def on_progress(bytes_moved, files_moved):
+            progress["bytes_done"] += bytes_moved
+            progress["files_done"] += files_moved
+            progress["files_left"] -= files_moved
+            report()
+
+        results = []
+        while not self.cancel_event.is_set():
+            with self.lock:
+                if len(self.batches) == 0:
+                    break
+                moves = self.batches.popleft()
+            progress["files_left"] = len(moves)
+            for source_path, dest_path in moves:
+                try:
+                    progress["bytes_total"] += os.stat(source_path).st_size
+                except OSError:
+                    pass
+            try:
+                result = self.file_mover.move_files(
+                    moves, on_progress, self.cancel_event.is_set)
+            except BaseException:
+                # The batch is dropped
+                self.file_mover.discard_partial_copies(moves)
+                raise
+            results.append(result)
+            if len(result.remaining) > 0:
+                with self.lock:
+                    self.batches.appendleft(result.remaining)
+            progress["files_left"] = 0
+            report(force=True)
+        return results
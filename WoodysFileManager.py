@@ -1,30 +1,66 @@
 import sys
 import traceback
 import os
-import shutil
 import subprocess
 import ctypes
+import multiprocessing
 
 # from watchdog.observers import Observer
 # from watchdog.events import FileSystemEventHandler
 
 from WoodysFileWatcher import WoodysFileWatcher
 
-from PySide6.QtCore import Qt, QSize, QCoreApplication, QRunnable, Slot, Signal, QObject, QThreadPool
+from PySide6.QtCore import Qt, QSize, QCoreApplication, QRunnable, Slot, Signal, QObject, QThread, QThreadPool, QTimer
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QTableWidgetItem, QTableWidget, QTreeWidgetItem, QLabel,
-    QPushButton, QWidget, QHBoxLayout, QComboBox, QAbstractItemView)
+    QApplication, QMainWindow, QLabel,
+    QPushButton, QWidget, QHBoxLayout, QComboBox)
 from PySide6.QtGui import QCursor, QFont, QIcon, QBrush, QPalette, QColor
 from spinner import WaitingSpinner
 from WoodysFileManager_ui import Ui_MainWindow
 from FileCollection import FileCollection
+from FileMover import FileMover
+from TransferScheduler import TransferScheduler, TransferProgress
+from FileTableModel import FileTableModel
+from CategoryTreeModel import CategoryTreeModel
 
 
 class WoodysFileManager(QMainWindow, Ui_MainWindow):
-    file_collection: FileCollection
+    # FileRowDeltas of the file watcher, emitted from its writer thread
+    fileRowDeltas = Signal(object)
+    # Folder events of the file watcher: event type ("created", "deleted"
+    # or "moved"), src_path and dest_path
+    directoryChanged = Signal(str, str, str)
+    file_collection: FileCollection = None
     search_path = ""
     subcategory_widgets = []
     spinner = None
+    file_mover: FileMover = None
+    file_watcher: WoodysFileWatcher = None
+    transfer_scheduler: TransferScheduler = None
+    # Runs the transfers of the sort page one after the other
+    transfer_thread_pool: QThreadPool = None
+    is_transfer_running = False
+    # (source, destination, error) of the moves of the shown transfer that
+    # failed
+    failed_moves = []
+    category_tree_model: CategoryTreeModel = None
+    display_files_model: FileTableModel
+    unsorted_files_model: FileTableModel
+    # One thread per table, so a table's searches run one after the other
+    search_thread_pools = {}
+    # Search as you type, once typing paused this long
+    search_delay_milliseconds = 150
+    # Files changed by then are looked at together by the next duplicate
+    # search
+    duplicates_delay_milliseconds = 2000
+    duplicates_timer: QTimer = None
+    is_finding_duplicates = False
+    # Changed files are extracted for the content search together, once
+    # changes paused this long
+    content_indexing_delay_milliseconds = 5000
+    content_indexing_timer: QTimer = None
+    is_indexing_contents = False
+    search_timer: QTimer
 
     def __init__(self):
         def init_table_widget_column_sizes():
@@ -39,13 +75,45 @@ class WoodysFileManager(QMainWindow, Ui_MainWindow):
             self.unsortedFilesTableWidget.setColumnWidth(2, 200)
             self.unsortedFilesTableWidget.setColumnWidth(3, 95)
 
+        def init_table_models():
+            self.display_files_model = FileTableModel(self, self.start_table_search)
+            self.displayFilesTableWidget.setModel(self.display_files_model)
+            self.displayFilesTableWidget.horizontalHeader().setSortIndicator(
+                0, Qt.SortOrder.AscendingOrder)
+            self.unsorted_files_model = FileTableModel(self, self.start_table_search)
+            self.unsortedFilesTableWidget.setModel(self.unsorted_files_model)
+            self.unsortedFilesTableWidget.horizontalHeader().setSortIndicator(
+                0, Qt.SortOrder.AscendingOrder)
+            # The selection model only exists once the model is set
+            self.unsortedFilesTableWidget.selectionModel().selectionChanged.connect(
+                lambda selected, deselected: self.onUnsortedFilesTableSelectionChange())
+
         super().__init__()
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint)
         myappid = 'woodythedev.woodysfilemanager.1'  # arbitrary string
         ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
         self.setWindowIcon(QIcon(u":/images/icon/woody-the-dev.svg"))
         self.setupUi(self)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.search_delay_milliseconds)
+        self.search_timer.timeout.connect(self.search_and_display_files)
+        self.duplicates_timer = QTimer(self)
+        self.duplicates_timer.setSingleShot(True)
+        self.duplicates_timer.setInterval(self.duplicates_delay_milliseconds)
+        self.duplicates_timer.timeout.connect(self.start_find_duplicates)
+        self.content_indexing_timer = QTimer(self)
+        self.content_indexing_timer.setSingleShot(True)
+        self.content_indexing_timer.setInterval(self.content_indexing_delay_milliseconds)
+        self.content_indexing_timer.timeout.connect(self.start_index_file_contents)
+        self.fileRowDeltas.connect(self.apply_file_row_deltas)
+        self.directoryChanged.connect(self.apply_directory_change)
+        init_table_models()
         init_table_widget_column_sizes()
+        self.transfer_thread_pool = QThreadPool(self)
+        self.transfer_thread_pool.setMaxThreadCount(1)
+        self.transferLabel.setVisible(False)
+        self.transferCancelButton.setVisible(False)
 
     def init_display_files_page(self):
         self.exactPathCheckBox.setChecked(True)
@@ -72,82 +140,184 @@ class WoodysFileManager(QMainWindow, Ui_MainWindow):
         
     def init_file_collection(self, progress_callback):
         self.file_collection = FileCollection(self.windowTitle())
-        WoodysFileWatcher(self).run()
+        # Content sniffing is done by enrich_file_collection after startup
+        self.file_collection.defer_file_type_sniffing = True
+        self.file_collection.build_index(progress_callback)
+        # Before the watcher, which skips the events of its moves
+        self.file_mover = FileMover(self.file_collection)
+        self.transfer_scheduler = TransferScheduler(self.file_mover)
+        self.file_watcher = WoodysFileWatcher(self)
+        self.file_watcher.run()
+
+    def enrich_file_collection(self, progress_callback):
+        # Sniffing is background work, don't compete with the GUI for I/O
+        QThread.currentThread().setPriority(QThread.Priority.LowestPriority)
+        try:
+            return self.file_collection.enrich_file_types(progress_callback)
+        finally:
+            QThread.currentThread().setPriority(QThread.Priority.InheritPriority)
 
-    def finished_file_collection(self):
+    def start_enrich_file_collection(self):
+        worker = Worker(self.enrich_file_collection)
+        worker.signals.finished.connect(self.finished_enrich_file_collection)
+        QThreadPool.globalInstance().start(worker)
+
+    def finished_enrich_file_collection(self):
+        # Show the sniffed file types
+        self.search_and_display_files()
+        self.refreshUnsortedFilesTable()
+        self.start_index_file_contents()
+
+    def index_file_contents(self, progress_callback):
+        # Like enrich_file_collection background work, the extraction runs
+        # in worker processes
+        QThread.currentThread().setPriority(QThread.Priority.LowestPriority)
+        try:
+            return self.file_collection.index_file_contents(progress_callback)
+        finally:
+            QThread.currentThread().setPriority(QThread.Priority.InheritPriority)
+
+    def start_index_file_contents(self):
+        if self.is_indexing_contents:
+            # Looked at again once the running pass is done
+            self.content_indexing_timer.start()
+            return
+        self.is_indexing_contents = True
+        worker = Worker(self.index_file_contents)
+        worker.signals.finished.connect(self.finished_index_file_contents)
+        QThreadPool.globalInstance().start(worker)
+
+    def finished_index_file_contents(self):
+        self.is_indexing_contents = False
+        if self.is_content_search():
+            self.search_and_display_files()
+
+    def show_file_collection(self):
         self.mainStackedWidget.setCurrentIndex(0)
         self.supportStackedWidget.setCurrentIndex(0)
         self.init_display_files_page()
         self.init_sort_files_page()
         self.spinner.stop()
 
+    def progress_file_collection(self, indexed_documents):
+        # Show the already committed files while the index is still building
+        if self.spinner.is_spinning:
+            self.show_file_collection()
+        else:
+            self.search_and_display_files()
+            self.refreshUnsortedFilesTable()
+
+    def finished_file_collection(self):
+        if self.spinner.is_spinning:
+            self.show_file_collection()
+        else:
+            self.refresh_category_tree()
+            self.search_and_display_files()
+            self.refreshUnsortedFilesTable()
+        self.start_enrich_file_collection()
+        self.start_find_duplicates()
+
     def insert_category_comboBox(self, top_category, comboBox: QComboBox):
-        main_categories = self.file_collection.dir_tree[top_category]
+        main_categories = self.file_collection.sub_dirs(top_category)
         for category in main_categories:
             comboBox.addItem(category, category)
 
     # ToDo: refresh category disappears sometimes when folder is added/changed through file explorer.
     def refresh_category_tree(self):
-        self.file_collection.refresh_dir_tree()
-        # Add children recursive
-
-        def add_children(node: QTreeWidgetItem, key):
-            for child in self.file_collection.dir_tree[key]:
-                child_node = QTreeWidgetItem([child])
-                child_key = key + os.path.sep + child
-                child_node.setData(0, Qt.ItemDataRole.UserRole, child_key)
-                node.addChild(child_node)
-                add_children(child_node, child_key)
-
-        key = self.file_collection.path_to_user_files
-        root = QTreeWidgetItem([os.path.basename(key)])
-        root.setData(0, Qt.ItemDataRole.UserRole, key)
-        add_children(root, key)
-        self.categoryTreeWidget.clear()
-        self.categoryTreeWidget.addTopLevelItem(root)
+        # Folders are only listed once expanded
+        self.category_tree_model = CategoryTreeModel(self.file_collection, self)
+        self.categoryTreeWidget.setModel(self.category_tree_model)
+        # The selection model only exists once the model is set
+        self.categoryTreeWidget.selectionModel().currentChanged.connect(
+            lambda current, previous: self.onCategoryTreeCurrentItemChange(current))
+
+        self.categoryTreeWidget.expand(self.category_tree_model.index(0, 0))
         self.categoryTreeWidget.resizeColumnToContents(0)
 
-        # ToDo: bugfix so that expand works with watcher/file explorer too.
-        # logs error but works with sort button.
-        # QBasicTimer::start: QBasicTimer can only be used with threads started with QThread.
-        # Further error when tried with QTimer.
-        # QObject: Cannot create children for a parent that is in a different thread.
-        # (Parent is WoodysFileManager(0x1b9aff98560), parent's thread is QThread(0x1b9af2ea9d0), current thread is QThread(0x1b9b07eda20)
-        root.setExpanded(True)
-
-    def refresh_table_widget(self, results, table_widget: QTableWidget):
-        table_widget.setRowCount(0)
-        for hit in results:
-            rowPosition = table_widget.rowCount()
-            table_widget.insertRow(rowPosition)
-            file_name_item = QTableWidgetItem(hit["file_name"])
-            file_name_item.setData(
-                Qt.ItemDataRole.UserRole, hit["path_with_file_name"])
-            table_widget.setItem(
-                rowPosition, 0, file_name_item)
-            file_size_item = QTableWidgetItem(str(hit["file_size"]) + " KB")
-            file_size_item.setTextAlignment(Qt.AlignTrailing | Qt.AlignVCenter)
-            table_widget.setItem(
-                rowPosition, 1, file_size_item)
-            table_widget.setItem(
-                rowPosition, 2, QTableWidgetItem(hit["file_type"]))
-            table_widget.setItem(
-                rowPosition, 3, QTableWidgetItem(hit["last_modified"].isoformat(
-                    sep=" ", timespec="seconds")))
+    def apply_directory_change(self, event_type, src_path, dest_path):
+        # Patches the listed folders of the category tree the event is about
+        if event_type == "created":
+            if len(self.file_collection.add_dir_to_tree(src_path)) > 0:
+                self.category_tree_model.directory_added(src_path)
+        elif event_type == "deleted":
+            self.file_collection.remove_dir_from_tree(src_path)
+            self.category_tree_model.directory_removed(src_path)
+        elif event_type == "moved":
+            self.category_tree_model.directory_removed(src_path)
+            if len(self.file_collection.move_dir_in_tree(src_path, dest_path)) > 0:
+                self.category_tree_model.directory_added(dest_path)
+            if self.search_path == src_path or \
+                    self.search_path.startswith(src_path + os.path.sep):
+                self.search_path = dest_path + self.search_path[len(src_path):]
+
+    def is_content_search(self):
+        return self.contentSearchCheckBox.checkState() == Qt.CheckState.Checked
 
     def search(self):
-        return self.file_collection.search(
-            self.search_path,
-            self.searchLineEdit.text(),
-            self.exactPathCheckBox.checkState() == Qt.CheckState.Unchecked)
+        search_path = self.search_path
+        filename_search_value = self.searchLineEdit.text()
+        is_exact_path_search = self.exactPathCheckBox.checkState() == Qt.CheckState.Unchecked
+        search_contents = self.is_content_search()
+        return lambda sort_key, reverse: self.file_collection.search_paged(
+            search_path, filename_search_value, is_exact_path_search, sort_key, reverse,
+            search_contents)
 
     def search_and_display_files(self):
-        self.refresh_table_widget(
-            self.search(), self.displayFilesTableWidget)
+        # Typing that is still waiting for its search is covered by this one
+        self.search_timer.stop()
+        refined_results = self.file_collection.refine_search(
+            self.display_files_model.refinable_results(),
+            self.search_path,
+            self.searchLineEdit.text(),
+            self.exactPathCheckBox.checkState() == Qt.CheckState.Unchecked,
+            *self.display_files_model.current_sort(),
+            self.is_content_search())
+        if refined_results is not None:
+            self.display_files_model.set_search(self.search(), refined_results)
+        else:
+            self.display_files_model.set_search(self.search())
 
     def refreshUnsortedFilesTable(self):
-        self.refresh_table_widget(self.file_collection.search(
-            "", "", True), self.unsortedFilesTableWidget)
+        self.unsorted_files_model.set_search(
+            lambda sort_key, reverse: self.file_collection.search_paged(
+                "", "", True, sort_key, reverse))
+
+    def apply_file_row_deltas(self, deltas):
+        # Changed files update the shown rows in place instead of searching
+        # again
+        self.display_files_model.apply_deltas(deltas)
+        self.unsorted_files_model.apply_deltas(deltas)
+        self.duplicates_timer.start()
+        self.content_indexing_timer.start()
+
+    def start_find_duplicates(self):
+        if self.is_finding_duplicates:
+            # Looked at again once the running search is done
+            self.duplicates_timer.start()
+            return
+        self.is_finding_duplicates = True
+        # Duplicates of the unsorted files, wherever the other copy is
+        worker = Worker(lambda progress_callback:
+                        self.file_collection.find_duplicates("", True))
+        worker.signals.result.connect(self.unsorted_files_model.set_duplicates)
+        worker.signals.finished.connect(self.finished_find_duplicates)
+        QThreadPool.globalInstance().start(worker)
+
+    def finished_find_duplicates(self):
+        self.is_finding_duplicates = False
+
+    def start_table_search(self, model: FileTableModel, search):
+        thread_pool = self.search_thread_pools.get(model)
+        if thread_pool is None:
+            thread_pool = QThreadPool(self)
+            thread_pool.setMaxThreadCount(1)
+            self.search_thread_pools[model] = thread_pool
+        # Searches still waiting for the thread are stale now, a running one
+        # finishes and its results are dropped by the model
+        thread_pool.clear()
+        worker = Worker(lambda progress_callback: search())
+        worker.signals.result.connect(model.show_search_results)
+        thread_pool.start(worker)
 
     def get_unsorted_files_table_scroll_positions(self):
         scroll_positions = {}
@@ -171,6 +341,22 @@ class WoodysFileManager(QMainWindow, Ui_MainWindow):
     def onWindowCloseClicked(self):
         self.close()
 
+    def closeEvent(self, event):
+        # Background passes end after their current batch, the thread pool
+        # waits for them when the app quits
+        if self.file_collection is not None:
+            self.file_collection.stop_background_work()
+        # The queue of transfers isn't kept, their partial copies are removed
+        if self.transfer_scheduler is not None:
+            self.transfer_scheduler.cancel()
+            self.transfer_thread_pool.waitForDone()
+            self.transfer_scheduler.discard()
+        # Commits the changes the watcher still buffers, so the tables of
+        # the next start are up to date right away
+        if self.file_watcher is not None:
+            self.file_watcher.stop()
+        super().closeEvent(event)
+
     def onWindowMinimizeClicked(self):
         self.showMinimized()
 
@@ -241,14 +427,23 @@ class WoodysFileManager(QMainWindow, Ui_MainWindow):
     def onSearchLineEnterPressed(self):
         self.search_and_display_files()
 
-    def onCategoryTreeCurrentItemChange(self, item):
-        self.search_path = item.data(0, Qt.ItemDataRole.UserRole)
+    def onSearchLineTextChanged(self):
+        # Restarted on every keystroke
+        self.search_timer.start()
+
+    def onCategoryTreeCurrentItemChange(self, index):
+        if not index.isValid():
+            return
+        self.search_path = index.data(Qt.ItemDataRole.UserRole)
         self.searchLineEdit.setText("")
         self.search_and_display_files()
 
     def onExactPathCheckBoxStateChange(self, state):
         self.search_and_display_files()
 
+    def onContentSearchCheckBoxStateChange(self, state):
+        self.search_and_display_files()
+
     def onUnsortedFilesTableSelectionChange(self):
         # Set first selected filename to textEdit
         selected_rows = self.unsortedFilesTableWidget.selectionModel().selectedRows()
@@ -261,17 +456,6 @@ class WoodysFileManager(QMainWindow, Ui_MainWindow):
             else:
                 self.allFilesCheckBox.setEnabled(False)
 
-    def reselect_remaining_rows_unsorted_files_table(self, selected_rows):
-        # Reselect remaining rows
-        if len(selected_rows) > 1:
-            selected_rows.pop()
-            self.unsortedFilesTableWidget.setSelectionMode(
-                QAbstractItemView.MultiSelection)
-            for row in selected_rows:
-                self.unsortedFilesTableWidget.selectRow(row.row())
-            self.unsortedFilesTableWidget.setSelectionMode(
-                QAbstractItemView.ExtendedSelection)
-
     def onFileSortClicked(self):
         selected_rows = self.unsortedFilesTableWidget.selectionModel().selectedRows()
         if len(selected_rows) > 0:
@@ -283,18 +467,17 @@ class WoodysFileManager(QMainWindow, Ui_MainWindow):
                     QComboBox, u"subcategoryComboBox_" + str(i + 1)).currentText()
                 if sub_category_text != "":
                     dest_path = dest_path + os.path.sep + sub_category_text
-            # Make directories if dest_path does not exist
-            # if os.path.exists(dest_path) == False:
-            os.makedirs(dest_path, exist_ok=True)
-
-            # Move file to new destination, update index and refresh table
+            # Move files to new destination off the GUI thread, missing
+            # directories are made there. The index and tables are updated
+            # once for the whole batch.
             model = self.unsortedFilesTableWidget.model()
+            moves = []
             # All selected files in one go
             if self.allFilesCheckBox.checkState() == Qt.CheckState.Checked:
                 for row in selected_rows:
                     source_path = model.data(row, Qt.ItemDataRole.UserRole)
                     dest_file_path = dest_path + os.path.sep + model.data(row)
-                    shutil.move(source_path, dest_file_path)
+                    moves.append((source_path, dest_file_path))
             # First selected file
             else:
                 row = selected_rows[0]
@@ -305,7 +488,78 @@ class WoodysFileManager(QMainWindow, Ui_MainWindow):
                 if file_name_split[1] == "":
                     file_name = file_name + os.path.splitext(source_path)[1]
                 dest_file_path = dest_path + os.path.sep + file_name
-                shutil.move(source_path, dest_file_path)
+                moves.append((source_path, dest_file_path))
+            self.start_file_moves(moves)
+
+    def start_file_moves(self, moves):
+        # Queued behind the sort operations that are still running
+        self.transfer_scheduler.enqueue(moves)
+        if not self.is_transfer_running:
+            self.start_transfer()
+
+    def start_transfer(self, is_continued=False):
+        self.is_transfer_running = True
+        if not is_continued:
+            self.failed_moves = []
+            self.transferLabel.setToolTip("")
+        self.transferLabel.setText("")
+        self.transferLabel.setVisible(True)
+        self.transferCancelButton.setText(
+            QCoreApplication.translate("MainWindow", u"ABBRECHEN", None))
+        self.transferCancelButton.setVisible(True)
+        worker = Worker(self.transfer_scheduler.run)
+        worker.signals.progress.connect(self.progress_transfer)
+        worker.signals.result.connect(self.finished_transfer)
+        # Only unexpected errors end up here, the batch that was running is
+        # dropped, the moves queued behind it stay queued
+        worker.signals.error.connect(lambda error: self.finished_transfer([]))
+        self.transfer_thread_pool.start(worker)
+
+    def progress_transfer(self, progress: TransferProgress):
+        self.transferLabel.setText(
+            f"{progress.files_done} / {progress.files_total} Dateien\n"
+            f"{progress.bytes_done / 1e6:.0f} / {progress.bytes_total / 1e6:.0f} MB, "
+            f"{progress.bytes_per_second / 1e6:.1f} MB/s, "
+            f"{progress.files_per_second:.1f} Dateien/s")
+
+    def finished_transfer(self, results):
+        self.is_transfer_running = False
+        for result in results:
+            self.failed_moves.extend(result.failed)
+            self.apply_file_row_deltas(result.deltas)
+        if self.transfer_scheduler.pending_files() > 0 and \
+                not self.transfer_scheduler.cancel_event.is_set():
+            # Queued by a sort just as the run ended, not cancelled
+            self.start_transfer(is_continued=True)
+            return
+        failed = self.failed_moves
+        # The failed moves are listed in the tooltip, the label stays until
+        # the next transfer
+        failed_text = ""
+        if len(failed) > 0:
+            failed_text = f"\n{len(failed)} Dateien nicht verschoben"
+        self.transferLabel.setToolTip("\n".join(
+            f"{os.path.basename(source_path)} -> {dest_path}: {error.strerror or error}"
+            for source_path, dest_path, error in failed))
+        pending_files = self.transfer_scheduler.pending_files()
+        if pending_files > 0:
+            # Cancelled, kept until resumed
+            self.transferLabel.setText(
+                f"Abgebrochen, {pending_files} Dateien offen" + failed_text)
+            self.transferCancelButton.setText(
+                QCoreApplication.translate("MainWindow", u"FORTSETZEN", None))
+        elif len(failed) > 0:
+            self.transferLabel.setText(failed_text.strip())
+            self.transferCancelButton.setVisible(False)
+        else:
+            self.transferLabel.setVisible(False)
+            self.transferCancelButton.setVisible(False)
+
+    def onTransferCancelClicked(self):
+        if self.is_transfer_running:
+            self.transfer_scheduler.cancel()
+        elif self.transfer_scheduler.pending_files() > 0:
+            self.start_transfer()
 
     def onAddSubcategoryClicked(self):
         self.add_subcategory_selection()
@@ -327,7 +581,7 @@ class WoodysFileManager(QMainWindow, Ui_MainWindow):
                 break
 
     # Utility slots
-    def onCategoryTreeExpandToggle(self, item):
+    def onCategoryTreeExpandToggle(self, index):
         self.categoryTreeWidget.resizeColumnToContents(0)
 
     # GUI
@@ -434,13 +688,14 @@ class WorkerSignals(QObject):
         object data returned from processing, anything
 
     progress
-        int indicating % progress
+        object, e.g. int indicating % progress or the number of processed
+        items, or a TransferProgress
 
     '''
     finished = Signal()
     error = Signal(tuple)
     result = Signal(object)
-    progress = Signal(int)
+    progress = Signal(object)
 
 
 
@@ -490,12 +745,16 @@ class Worker(QRunnable):
             self.signals.finished.emit()  # Done
 
 if __name__ == '__main__':
+    # The duplicate search hashes in worker processes, which start this
+    # script again in a frozen build
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     file_manager = WoodysFileManager()
     file_manager.show()
     file_manager.init_spinner()
     threadpool = QThreadPool()
     worker = Worker(file_manager.init_file_collection)
+    worker.signals.progress.connect(file_manager.progress_file_collection)
     worker.signals.finished.connect(file_manager.finished_file_collection)
     threadpool.start(worker)
     app.exec()
@@ -19,7 +19,7 @@ from PySide6.QtWidgets import (QAbstractItemView, QAbstractScrollArea, QApplicat
     QComboBox, QFrame, QHBoxLayout, QHeaderView,
     QLabel, QLineEdit, QMainWindow, QPushButton,
     QScrollArea, QSizePolicy, QSpacerItem, QStackedWidget,
-    QTableWidget, QTableWidgetItem, QTreeWidget, QTreeWidgetItem,
+    QTableView, QTreeView,
     QVBoxLayout, QWidget)
 import resources_rc
 import resources_rc
@@ -349,21 +349,7 @@ class Ui_MainWindow(object):
 
         self.verticalLayout_3.addWidget(self.frame_6, 0, Qt.AlignHCenter)
 
-        self.displayFilesTableWidget = QTableWidget(self.frame_4)
-        if (self.displayFilesTableWidget.columnCount() < 4):
-            self.displayFilesTableWidget.setColumnCount(4)
-        __qtablewidgetitem = QTableWidgetItem()
-        __qtablewidgetitem.setTextAlignment(Qt.AlignLeading|Qt.AlignVCenter);
-        self.displayFilesTableWidget.setHorizontalHeaderItem(0, __qtablewidgetitem)
-        __qtablewidgetitem1 = QTableWidgetItem()
-        __qtablewidgetitem1.setTextAlignment(Qt.AlignTrailing|Qt.AlignVCenter);
-        self.displayFilesTableWidget.setHorizontalHeaderItem(1, __qtablewidgetitem1)
-        __qtablewidgetitem2 = QTableWidgetItem()
-        __qtablewidgetitem2.setTextAlignment(Qt.AlignLeading|Qt.AlignVCenter);
-        self.displayFilesTableWidget.setHorizontalHeaderItem(2, __qtablewidgetitem2)
-        __qtablewidgetitem3 = QTableWidgetItem()
-        __qtablewidgetitem3.setTextAlignment(Qt.AlignLeading|Qt.AlignVCenter);
-        self.displayFilesTableWidget.setHorizontalHeaderItem(3, __qtablewidgetitem3)
+        self.displayFilesTableWidget = QTableView(self.frame_4)
         self.displayFilesTableWidget.setObjectName(u"displayFilesTableWidget")
         self.displayFilesTableWidget.setMinimumSize(QSize(845, 584))
         palette1 = QPalette()
@@ -433,7 +419,6 @@ class Ui_MainWindow(object):
         self.displayFilesTableWidget.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.displayFilesTableWidget.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.displayFilesTableWidget.setSortingEnabled(True)
-        self.displayFilesTableWidget.setRowCount(0)
         self.displayFilesTableWidget.horizontalHeader().setMinimumSectionSize(95)
         self.displayFilesTableWidget.horizontalHeader().setDefaultSectionSize(250)
         self.displayFilesTableWidget.horizontalHeader().setHighlightSections(False)
@@ -522,21 +507,7 @@ class Ui_MainWindow(object):
 
         self.verticalLayout.addWidget(self.unsortTitle)
 
-        self.unsortedFilesTableWidget = QTableWidget(self.frame_5)
-        if (self.unsortedFilesTableWidget.columnCount() < 4):
-            self.unsortedFilesTableWidget.setColumnCount(4)
-        __qtablewidgetitem4 = QTableWidgetItem()
-        __qtablewidgetitem4.setTextAlignment(Qt.AlignLeading|Qt.AlignVCenter);
-        self.unsortedFilesTableWidget.setHorizontalHeaderItem(0, __qtablewidgetitem4)
-        __qtablewidgetitem5 = QTableWidgetItem()
-        __qtablewidgetitem5.setTextAlignment(Qt.AlignTrailing|Qt.AlignVCenter);
-        self.unsortedFilesTableWidget.setHorizontalHeaderItem(1, __qtablewidgetitem5)
-        __qtablewidgetitem6 = QTableWidgetItem()
-        __qtablewidgetitem6.setTextAlignment(Qt.AlignLeading|Qt.AlignVCenter);
-        self.unsortedFilesTableWidget.setHorizontalHeaderItem(2, __qtablewidgetitem6)
-        __qtablewidgetitem7 = QTableWidgetItem()
-        __qtablewidgetitem7.setTextAlignment(Qt.AlignLeading|Qt.AlignVCenter);
-        self.unsortedFilesTableWidget.setHorizontalHeaderItem(3, __qtablewidgetitem7)
+        self.unsortedFilesTableWidget = QTableView(self.frame_5)
         self.unsortedFilesTableWidget.setObjectName(u"unsortedFilesTableWidget")
         self.unsortedFilesTableWidget.setMinimumSize(QSize(845, 584))
         palette2 = QPalette()
@@ -606,7 +577,6 @@ class Ui_MainWindow(object):
         self.unsortedFilesTableWidget.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.unsortedFilesTableWidget.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.unsortedFilesTableWidget.setSortingEnabled(True)
-        self.unsortedFilesTableWidget.setRowCount(0)
         self.unsortedFilesTableWidget.horizontalHeader().setMinimumSectionSize(95)
         self.unsortedFilesTableWidget.horizontalHeader().setDefaultSectionSize(250)
         self.unsortedFilesTableWidget.horizontalHeader().setHighlightSections(False)
@@ -663,13 +633,16 @@ class Ui_MainWindow(object):
 
         self.horizontalLayout_5.addWidget(self.exactPathCheckBox)
 
+        self.contentSearchCheckBox = QCheckBox(self.widget)
+        self.contentSearchCheckBox.setObjectName(u"contentSearchCheckBox")
+        self.contentSearchCheckBox.setTristate(False)
+
+        self.horizontalLayout_5.addWidget(self.contentSearchCheckBox)
+
 
         self.verticalLayout_2.addWidget(self.widget)
 
-        self.categoryTreeWidget = QTreeWidget(self.frame_2)
-        __qtreewidgetitem = QTreeWidgetItem()
-        __qtreewidgetitem.setText(0, u"1");
-        self.categoryTreeWidget.setHeaderItem(__qtreewidgetitem)
+        self.categoryTreeWidget = QTreeView(self.frame_2)
         self.categoryTreeWidget.setObjectName(u"categoryTreeWidget")
         palette3 = QPalette()
         palette3.setBrush(QPalette.Active, QPalette.Button, brush)
@@ -894,6 +867,28 @@ class Ui_MainWindow(object):
 
         self.verticalLayout_9.addWidget(self.allFilesCheckBox)
 
+        self.transferLabel = QLabel(self.frame_7)
+        self.transferLabel.setObjectName(u"transferLabel")
+        self.transferLabel.setAlignment(Qt.AlignCenter)
+        self.transferLabel.setWordWrap(True)
+
+        self.verticalLayout_9.addWidget(self.transferLabel)
+
+        self.transferCancelButton = QPushButton(self.frame_7)
+        self.transferCancelButton.setObjectName(u"transferCancelButton")
+        self.transferCancelButton.setMinimumSize(QSize(161, 41))
+        self.transferCancelButton.setMaximumSize(QSize(161, 41))
+        self.transferCancelButton.setFont(font4)
+        self.transferCancelButton.setCursor(QCursor(Qt.PointingHandCursor))
+        self.transferCancelButton.setStyleSheet(u"QPushButton {\n"
+"	background-color: rgba(84,159,176,1);\n"
+"	border-radius: 3px;\n"
+"	text-align: center;\n"
+"	color: white;\n"
+"}")
+
+        self.verticalLayout_9.addWidget(self.transferCancelButton)
+
 
         self.verticalLayout_8.addWidget(self.frame_7, 0, Qt.AlignHCenter)
 
@@ -912,16 +907,17 @@ class Ui_MainWindow(object):
         self.retranslateUi(MainWindow)
         self.overviewButton.clicked.connect(MainWindow.onOverviewClicked)
         self.fileSortButton.clicked.connect(MainWindow.onFileSortClicked)
+        self.transferCancelButton.clicked.connect(MainWindow.onTransferCancelClicked)
         self.searchButton.clicked.connect(MainWindow.onSearchClicked)
         self.unsortOverviewButton.clicked.connect(MainWindow.onUnsortOverviewClicked)
-        self.displayFilesTableWidget.itemDoubleClicked.connect(MainWindow.onFileItemDoubleClicked)
-        self.categoryTreeWidget.currentItemChanged.connect(MainWindow.onCategoryTreeCurrentItemChange)
-        self.categoryTreeWidget.itemExpanded.connect(MainWindow.onCategoryTreeExpandToggle)
-        self.categoryTreeWidget.itemCollapsed.connect(MainWindow.onCategoryTreeExpandToggle)
+        self.displayFilesTableWidget.doubleClicked.connect(MainWindow.onFileItemDoubleClicked)
+        self.categoryTreeWidget.expanded.connect(MainWindow.onCategoryTreeExpandToggle)
+        self.categoryTreeWidget.collapsed.connect(MainWindow.onCategoryTreeExpandToggle)
         self.exactPathCheckBox.stateChanged.connect(MainWindow.onExactPathCheckBoxStateChange)
+        self.contentSearchCheckBox.stateChanged.connect(MainWindow.onContentSearchCheckBoxStateChange)
         self.addSubcategoryPushButton.clicked.connect(MainWindow.onAddSubcategoryClicked)
-        self.unsortedFilesTableWidget.itemSelectionChanged.connect(MainWindow.onUnsortedFilesTableSelectionChange)
         self.searchLineEdit.returnPressed.connect(MainWindow.onSearchLineEnterPressed)
+        self.searchLineEdit.textChanged.connect(MainWindow.onSearchLineTextChanged)
         self.windowCloseButton.clicked.connect(MainWindow.onWindowCloseClicked)
         self.windowMinimizeButton.clicked.connect(MainWindow.onWindowMinimizeClicked)
 
@@ -941,31 +937,18 @@ class Ui_MainWindow(object):
         self.overviewButton.setText("")
         self.unsortOverviewButton.setText("")
         self.searchButton.setText("")
-        ___qtablewidgetitem = self.displayFilesTableWidget.horizontalHeaderItem(0)
-        ___qtablewidgetitem.setText(QCoreApplication.translate("MainWindow", u"Dateiname", None));
-        ___qtablewidgetitem1 = self.displayFilesTableWidget.horizontalHeaderItem(1)
-        ___qtablewidgetitem1.setText(QCoreApplication.translate("MainWindow", u"Dateigr\u00f6\u00dfe", None));
-        ___qtablewidgetitem2 = self.displayFilesTableWidget.horizontalHeaderItem(2)
-        ___qtablewidgetitem2.setText(QCoreApplication.translate("MainWindow", u"Dateityp", None));
-        ___qtablewidgetitem3 = self.displayFilesTableWidget.horizontalHeaderItem(3)
-        ___qtablewidgetitem3.setText(QCoreApplication.translate("MainWindow", u"Zuletzt ge\u00e4ndert", None));
         self.label_4.setText(QCoreApplication.translate("MainWindow", u"Dokumente werden geladen", None))
         self.unsortTitle.setText(QCoreApplication.translate("MainWindow", u"Unsortierte Dateien", None))
-        ___qtablewidgetitem4 = self.unsortedFilesTableWidget.horizontalHeaderItem(0)
-        ___qtablewidgetitem4.setText(QCoreApplication.translate("MainWindow", u"Dateiname", None));
-        ___qtablewidgetitem5 = self.unsortedFilesTableWidget.horizontalHeaderItem(1)
-        ___qtablewidgetitem5.setText(QCoreApplication.translate("MainWindow", u"Dateigr\u00f6\u00dfe", None));
-        ___qtablewidgetitem6 = self.unsortedFilesTableWidget.horizontalHeaderItem(2)
-        ___qtablewidgetitem6.setText(QCoreApplication.translate("MainWindow", u"Dateityp", None));
-        ___qtablewidgetitem7 = self.unsortedFilesTableWidget.horizontalHeaderItem(3)
-        ___qtablewidgetitem7.setText(QCoreApplication.translate("MainWindow", u"Zuletzt ge\u00e4ndert", None));
         self.categoryTitle.setText(QCoreApplication.translate("MainWindow", u"Kategorien", None))
         self.exactPathCheckBox.setText(QCoreApplication.translate("MainWindow", u"Mit Unterkatogorien", None))
+        self.contentSearchCheckBox.setText(QCoreApplication.translate("MainWindow", u"Inhalte durchsuchen", None))
         self.label.setText("")
         self.sortFilenameLineEdit.setText(QCoreApplication.translate("MainWindow", u"Dateiname", None))
         self.categoryLabel.setText(QCoreApplication.translate("MainWindow", u"Kategorie", None))
         self.addSubcategoryPushButton.setText(QCoreApplication.translate("MainWindow", u"Unterkategorie", None))
         self.fileSortButton.setText(QCoreApplication.translate("MainWindow", u"EINSORTIEREN", None))
         self.allFilesCheckBox.setText(QCoreApplication.translate("MainWindow", u"Alle ausgew\u00e4hlten Dateien", None))
+        self.transferLabel.setText("")
+        self.transferCancelButton.setText(QCoreApplication.translate("MainWindow", u"ABBRECHEN", None))
     # retranslateUi
 
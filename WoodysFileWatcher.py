@@ -3,96 +3,117 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from pathlib import Path
 
-from PySide6.QtCore import Qt
+from FileEventCoalescer import FileEventCoalescer
+from IndexWriterService import IndexWriterService
 
 
 class WoodysFileWatcher():
     file_manager = None
+    watcher = None
 
     class WoodysFileManagerHandler(FileSystemEventHandler):
         def __init__(self, file_manager):
             super().__init__()
             self.file_manager = file_manager
+            # All changes are written by this one thread, never by the
+            # observer thread itself
+            self.index_writer_service = IndexWriterService(
+                file_manager.file_collection, self.on_index_committed)
+            self.index_writer_service.start()
+            # Bursts of events, e.g. saving a document or copying a folder,
+            # reach the index as one batch
+            self.event_coalescer = FileEventCoalescer(
+                self.index_writer_service.submit)
+            self.event_coalescer.start()
+            # Its moves are in the index already, the ones it couldn't index
+            # are written by the service
+            self.file_mover = file_manager.file_mover
+            self.file_mover.index_changes = self.index_writer_service.submit
 
-        # ToDo: update gui incremental
-        # ToDo: fix refresh_category_tree
         def on_modified(self, event):
-            if event.is_directory == False:
+            if event.is_directory == False and \
+                    not self.file_mover.is_suppressed(event.src_path):
                 # print(f"File {event.src_path} has been modified")
-                self.file_manager.file_collection.update_doc_to_index(
-                    event.src_path, event.src_path)
-                self.refreshGUI(event.src_path)
+                self.event_coalescer.modified(event.src_path)
 
         def on_moved(self, event):
             if event.is_directory == False:
+                if self.file_mover.is_suppressed(event.src_path) and \
+                        self.file_mover.is_suppressed(event.dest_path):
+                    return
                 # print(f"File {event.src_path} has been moved to {
                 #   event.dest_path}")
-                self.file_manager.file_collection.update_doc_to_index(
-                    event.src_path, event.dest_path)
-                self.refreshGUI(event.src_path)
-            # else:
+                self.event_coalescer.moved(event.src_path, event.dest_path)
+            else:
                 # print(f"Folder {event.src_path} has been moved to {
                 #   event.dest_path}")
-                # self.file_manager.refresh_category_tree()
+                self.directory_changed(event)
 
         def on_created(self, event):
             if event.is_directory == False:
+                if self.file_mover.is_suppressed(event.src_path):
+                    return
                 # print(f"File {event.src_path} has been created")
-                self.file_manager.file_collection.add_doc_to_index(
-                    None, event.src_path).commit()
-                self.refreshGUI(event.src_path)
-            # else:
+                self.event_coalescer.created(event.src_path)
+            else:
                 # print(f"Folder {event.src_path} has been created")
-                # self.file_manager.refresh_category_tree()
+                self.directory_changed(event)
 
         def on_deleted(self, event):
             # toDo: why the heck is a folder checked as a file?
-            if Path(event.src_path).is_dir() == False:
+            if Path(event.src_path).is_dir() == False and \
+                    not self.file_mover.is_suppressed(event.src_path):
                 # print(f"File {event.src_path} has been deleted")
-                self.file_manager.file_collection.delete_doc_from_index(
-                    event.src_path)
-                self.refreshGUI(event.src_path)
-            # else:
+                self.event_coalescer.deleted(event.src_path)
+            # A deleted folder can come as a file event, it doesn't exist
+            # anymore to tell
+            if event.is_directory or \
+                    event.src_path in self.file_manager.file_collection.dir_tree:
                 # print(f"Folder {event.src_path} has been deleted")
-                # self.file_manager.refresh_category_tree()
+                self.directory_changed(event)
 
-        # ToDo scroll to previous position after refresh
-        def refreshGUI(self, src_path):
-            if self.file_manager.search_path != "":
-                current_display_files_path = self.file_manager.search_path
-            else:
-                current_display_files_path = self.file_manager.file_collection.path_to_user_files
-            # Check if change is in current display files page
-            if self.file_manager.allFilesCheckBox.checkState() == Qt.CheckState.Unchecked and\
-                    str(Path(src_path).parent) == current_display_files_path or\
-                    self.file_manager.allFilesCheckBox.checkState() == Qt.CheckState.Checked and\
-                    current_display_files_path in str(Path(src_path).parent):
-                # scroll_position = self.file_manager.get_display_files_table_scroll_positions()
-                self.file_manager.search_and_display_files()
-                # self.file_manager.displayFilesTableWidget.scroll(scroll_position["x"], scroll_position["y"])
-            # Check if change is in unsorted files page
-            if str(Path(src_path).parent) == self.file_manager.file_collection.path_to_user_files:
-                # scroll_position = self.file_manager.get_unsorted_files_table_scroll_positions()
-                selected_rows = self.file_manager.unsortedFilesTableWidget.selectionModel().selectedRows()
-                self.file_manager.refreshUnsortedFilesTable()
-                # self.file_manager.unsortedFilesTableWidget.scroll(scroll_position["x"], scroll_position["y"])
-                self.file_manager.reselect_remaining_rows_unsorted_files_table(
-                    selected_rows)
+        def directory_changed(self, event):
+            # Queued to the GUI thread, which patches the category tree
+            self.file_manager.directoryChanged.emit(
+                event.event_type, event.src_path, getattr(event, "dest_path", ""))
+
+        def stop(self):
+            # Hands on the buffered events, then commits them
+            self.event_coalescer.stop()
+            self.index_writer_service.stop()
+
+        def on_index_committed(self, deltas):
+            # Queued to the GUI thread, which updates the shown rows
+            if len(deltas) > 0:
+                self.file_manager.fileRowDeltas.emit(deltas)
 
     class Watcher:
         def __init__(self, path, event_handler):
             self.path = path
             self.event_handler = event_handler
+            self.observer = None
 
         def run(self):
-            observer = Observer()
-            observer.schedule(self.event_handler, self.path, recursive=True)
-            observer.start()
+            self.observer = Observer()
+            self.observer.schedule(self.event_handler, self.path, recursive=True)
+            self.observer.start()
+
+        def stop(self):
+            # No new events, then the ones not in the index yet are written
+            self.observer.stop()
+            self.observer.join()
+            self.event_handler.stop()
 
     def __init__(self, file_manager):
         self.file_manager = file_manager
 
     def run(self):
         root_path = self.file_manager.file_collection.path_to_user_files
-        self.Watcher(root_path, self.WoodysFileManagerHandler(
-            self.file_manager)).run()
+        self.watcher = self.Watcher(root_path, self.WoodysFileManagerHandler(
+            self.file_manager))
+        self.watcher.run()
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
@@ -0,0 +1,192 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from FileCollection import FileCollection
+from FileMover import FileMover
+from whoosh.qparser import QueryParser
+
+
+def benchmark_index_build(path_to_user_files, processes):
+    # Cold build of the whole tree into a fresh index for every process count
+    for procs in processes:
+        path_to_user_index = tempfile.mkdtemp(prefix="woodys_benchmark_")
+        try:
+            file_collection = FileCollection(
+                "benchmark", path_to_user_files, path_to_user_index)
+            file_collection.index_processes = procs
+            start = time.perf_counter()
+            file_collection.build_index()
+            seconds = time.perf_counter() - start
+            documents = file_collection.ix.doc_count()
+            file_collection.ix.close()
+        finally:
+            shutil.rmtree(path_to_user_index, ignore_errors=True)
+        print(f"index build, {procs} process(es): {documents} documents "
+              f"in {seconds:.2f} s, {documents / seconds:.0f} documents/s")
+
+
+def benchmark_filename_search(path_to_user_files, queries, repeat):
+    path_to_user_index = tempfile.mkdtemp(prefix="woodys_benchmark_")
+    try:
+        file_collection = FileCollection(
+            "benchmark", path_to_user_files, path_to_user_index)
+        file_collection.build_index()
+        print(f"{file_collection.ix.doc_count()} documents")
+
+        def wildcard_search(filename_search_value):
+            # The wildcard query that was used before the trigram field
+            with file_collection.ix.searcher() as searcher:
+                query = QueryParser("file_name_with_extension", schema=file_collection.ix.schema).parse(
+                    "*" + filename_search_value + "*")
+                return [dict(hit.items()) for hit in searcher.search(query, limit=None)]
+
+        def trigram_search(filename_search_value):
+            return file_collection.search("", filename_search_value, False)
+
+        for filename_search_value in queries:
+            for name, search in (("wildcard", wildcard_search), ("trigram", trigram_search)):
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    hits = search(filename_search_value)
+                milliseconds = (time.perf_counter() - start) * 1000 / repeat
+                print(f"filename search {filename_search_value!r}, {name}: "
+                      f"{len(hits)} hits in {milliseconds:.1f} ms")
+        file_collection.ix.close()
+    finally:
+        shutil.rmtree(path_to_user_index, ignore_errors=True)
+
+
+def benchmark_search_as_you_type(path_to_user_files, queries, page_size):
+    path_to_user_index = tempfile.mkdtemp(prefix="woodys_benchmark_")
+    try:
+        file_collection = FileCollection(
+            "benchmark", path_to_user_files, path_to_user_index)
+        file_collection.build_index()
+        print(f"{file_collection.ix.doc_count()} documents")
+
+        for query in queries:
+            for refine in (False, True):
+                # Every keystroke searches, or refines the previous results
+                # where possible, and loads the first page of the table
+                results = None
+                for length in range(1, len(query) + 1):
+                    filename_search_value = query[:length]
+                    start = time.perf_counter()
+                    refined_results = None
+                    if refine:
+                        refined_results = file_collection.refine_search(
+                            results, "", filename_search_value, False, "file_name")
+                    if refined_results is not None:
+                        new_results = refined_results
+                    else:
+                        new_results = file_collection.search_paged(
+                            "", filename_search_value, False, "file_name")
+                    new_results.fetch(0, page_size)
+                    milliseconds = (time.perf_counter() - start) * 1000
+                    if results is not None:
+                        results.close()
+                    results = new_results
+                    how = "refined" if refined_results is not None else "searched"
+                    print(f"keystroke {filename_search_value!r}, {how}: "
+                          f"{results.total} hits, first page in {milliseconds:.1f} ms")
+                results.close()
+        file_collection.ix.close()
+    finally:
+        shutil.rmtree(path_to_user_index, ignore_errors=True)
+
+
+def benchmark_file_move(source_dir, dest_dir, files, megabytes):
+    # MB/s of moving files between two folders, with shutil.move and with
+    # the FileMover. Within one device both just rename, so the copy they
+    # fall back to across devices is measured instead.
+    source_dir = tempfile.mkdtemp(prefix="woodys_benchmark_", dir=source_dir)
+    dest_dir = tempfile.mkdtemp(prefix="woodys_benchmark_", dir=dest_dir)
+    try:
+        is_same_device = os.stat(source_dir).st_dev == os.stat(dest_dir).st_dev
+        file_mover = FileMover(None)
+
+        def copy2_and_remove(source_path, dest_path):
+            # What shutil.move does across devices
+            shutil.copy2(source_path, dest_path)
+            os.remove(source_path)
+
+        def copy_file_and_remove(source_path, dest_path):
+            file_mover.copy_file(source_path, dest_path)
+            os.remove(source_path)
+
+        if is_same_device:
+            print("same device, measuring the cross-device copy")
+            methods = (("shutil copy2", copy2_and_remove),
+                       ("FileMover copy_file", copy_file_and_remove))
+        else:
+            methods = (("shutil.move", shutil.move),
+                       ("FileMover.move_file", file_mover.move_file))
+        chunk = os.urandom(1024 * 1024)
+        for name, move in methods:
+            source_paths = []
+            for i in range(files):
+                source_path = os.path.join(source_dir, f"file_{i}.bin")
+                with open(source_path, "wb") as file:
+                    for _ in range(megabytes):
+                        file.write(chunk)
+                source_paths.append(source_path)
+            start = time.perf_counter()
+            for source_path in source_paths:
+                move(source_path, os.path.join(dest_dir, os.path.basename(source_path)))
+            seconds = time.perf_counter() - start
+            for file_name in os.listdir(dest_dir):
+                os.remove(os.path.join(dest_dir, file_name))
+            print(f"file move, {name}: {files} x {megabytes} MB in {seconds:.2f} s, "
+                  f"{files * megabytes / seconds:.0f} MB/s")
+    finally:
+        shutil.rmtree(source_dir, ignore_errors=True)
+        shutil.rmtree(dest_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for Woody's File Manager")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    index_build_parser = subparsers.add_parser(
+        "index-build", help="documents per second of a cold index build")
+    index_build_parser.add_argument("path_to_user_files")
+    index_build_parser.add_argument(
+        "--processes", type=int, nargs="+", default=[1, 2, 4])
+
+    filename_search_parser = subparsers.add_parser(
+        "filename-search", help="latency of infix file name searches")
+    filename_search_parser.add_argument("path_to_user_files")
+    filename_search_parser.add_argument(
+        "--queries", nargs="+", default=["rep", "port 1", "v3.pdf"])
+    filename_search_parser.add_argument("--repeat", type=int, default=10)
+
+    search_as_you_type_parser = subparsers.add_parser(
+        "search-as-you-type", help="keystroke to first table page latency while typing")
+    search_as_you_type_parser.add_argument("path_to_user_files")
+    search_as_you_type_parser.add_argument(
+        "--queries", nargs="+", default=["report", "v3.pdf"])
+    search_as_you_type_parser.add_argument("--page-size", type=int, default=200)
+
+    file_move_parser = subparsers.add_parser(
+        "file-move", help="MB/s of moving files, shutil.move against the FileMover")
+    file_move_parser.add_argument("source_dir")
+    file_move_parser.add_argument("dest_dir")
+    file_move_parser.add_argument("--files", type=int, default=10)
+    file_move_parser.add_argument("--megabytes", type=int, default=100)
+
+    args = parser.parse_args()
+    if args.benchmark == "index-build":
+        benchmark_index_build(args.path_to_user_files, args.processes)
+    elif args.benchmark == "filename-search":
+        benchmark_filename_search(
+            args.path_to_user_files, args.queries, args.repeat)
+    elif args.benchmark == "search-as-you-type":
+        benchmark_search_as_you_type(
+            args.path_to_user_files, args.queries, args.page_size)
+    elif args.benchmark == "file-move":
+        benchmark_file_move(
+            args.source_dir, args.dest_dir, args.files, args.megabytes)